@@ -1,17 +1,23 @@
 
 import streamlit as st
+from foodwaste_demo_startup import get_startup_report, preload_backends, record_first_render # first, to time the startup
 import pandas as pd
 import numpy as np
 
 from datetime import datetime, timedelta
 import holidays
 
-import plotly.express as px
-import plotly.graph_objects as go
-
 from foodwaste_demo_ai import * 
 from foodwaste_demo_strings import * 
 from foodwaste_demo_syntheticdata import * 
+from foodwaste_demo_history import HistoryStore
+from foodwaste_demo_charts import get_chart, get_kpis
+from foodwaste_demo_simulation import fast_forward
+from foodwaste_demo_training import training_scheduler
+from foodwaste_demo_persistence import ModelStore, get_history_path, load_history, prune_histories, save_history
+import foodwaste_demo_metrics as metrics
+
+metrics.start_rerun() # time the spans of this rerun, see the debug panel at the end
 
 # options
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
@@ -20,10 +26,15 @@ if "language" not in st.session_state:
     st.session_state.language = "Deutsch"
 # more on language in foodwaste_demo_strings.py
 
+if "holiday_subdiv" not in st.session_state:
+    st.session_state.holiday_subdiv = HOLIDAY_SUBDIV  # German state for holidays, Berlin by default
+
 if "show_history" not in st.session_state:
     st.session_state.show_history = False
 if "show_info" not in st.session_state:
     st.session_state.show_info = False
+if "show_kpis" not in st.session_state:
+    st.session_state.show_kpis = False
 
 if "budget" not in st.session_state:
     st.session_state.budget = 2000  # starting budget
@@ -39,6 +50,8 @@ if "prediction_explanation" not in st.session_state:
     st.session_state.prediction_explanation = None
 if "show_ai_explanation" not in st.session_state:
     st.session_state.show_ai_explanation = False
+if "optimize_profit" not in st.session_state:
+    st.session_state.optimize_profit = False
 
 # more in foodwaste_demo_ai.py
 
@@ -50,17 +63,41 @@ st.set_page_config(page_title="KI-Kuchenbestellung", layout="centered")
 # historical data 
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
 
-# On starting the interface, generate a synthetic data history
-if "data" not in st.session_state:
+# The base history is the same for everyone (fixed seed), so it is generated once per day and state (and saved to disk)
+# and shared read-only by all sessions (stored language-neutral, translated for display only). Sessions fork it and only store the days they played.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_base_history(day, subdiv):
+    """Returns the shared base history (HistoryStore) and its first tomorrow. Must not be modified."""
     k = 3 
-    start_date = datetime.today() - timedelta(days=k*365)  # k years ago
-    end_date = datetime.today() # Up to, including today (today's ordering was yesterday)
-    #end_date = datetime.today() - timedelta(days=7) # Debugging Aid
-    st.session_state.data = generate_synthetic_data(start_date, end_date, st.session_state.language)
-
-# And create a current tomorrow
-if "tomorrow_info" not in st.session_state:
-    st.session_state.tomorrow_info = generate_tomorrow(st.session_state.data, st.session_state.language)
+    end_date = datetime.combine(day, datetime.min.time()) # Up to, including today (today's ordering was yesterday)
+    start_date = end_date - timedelta(days=k*365)  # k years ago
+    #end_date = end_date - timedelta(days=7) # Debugging Aid
+    # Saved to disk once, so restarts and other workers memory-map it (and load its trained models) instead
+    path = get_history_path(day, subdiv)
+    base_history, base_tomorrow = load_history(path)
+    if base_history is None:
+        base_data = generate_synthetic_data(start_date, end_date, subdiv=subdiv)
+        base_tomorrow = generate_tomorrow(base_data, subdiv)
+        try:
+            if save_history(HistoryStore.from_frame(base_data), path, extra=base_tomorrow):
+                prune_histories(day)  # saves of earlier days are not used anymore
+            base_history, base_tomorrow = load_history(path)  # whoever saved first, all workers share the same id
+        except OSError:  # e.g. read-only file system, then just keep it in memory
+            pass
+        if base_history is None:
+            return HistoryStore.from_frame(base_data), base_tomorrow
+    # Models in a directory per dataset, as a history remapped to other vocabularies is a different dataset
+    model_registry.persist(base_history.id, ModelStore(path / "models" / base_history.id))
+    return base_history, base_tomorrow
+
+# On starting the interface, attach to the shared synthetic data history
+if "history" not in st.session_state:
+    with metrics.span("base_history"):
+        base_history, base_tomorrow = get_base_history(datetime.today().date(), st.session_state.holiday_subdiv)
+    st.session_state.history = base_history.fork()
+    st.session_state.tomorrow_info = dict(base_tomorrow) # And create a current tomorrow
+
+history = st.session_state.history
 
 # more in foodwaste_demo_syntheticdata.py
 
@@ -73,6 +110,7 @@ if "tomorrow_info" not in st.session_state:
 st.sidebar.write("## ⚙️")
 st.session_state.language = st.sidebar.radio("Sprache / Language", ["Deutsch", "English"])
 st.session_state.show_history = st.sidebar.toggle(get_localized_string("showhistory", st.session_state.language), value=st.session_state.show_history)
+st.session_state.show_kpis = st.sidebar.toggle(get_localized_string("showKpis", st.session_state.language), value=st.session_state.show_kpis)
 st.session_state.show_info = st.sidebar.toggle(get_localized_string("showinfo", st.session_state.language), value=st.session_state.show_info)
 
 # Budget Tracking 
@@ -104,103 +142,37 @@ if st.session_state.show_history:
     st.subheader(get_localized_string("salesHistory", st.session_state.language))
 
     # Show latest table entries
-    #st.write(st.session_state.data.tail())
-    #st.write(st.session_state.data) # or all entries
-    
-    # Filter last 14 days by default
-    full_data = st.session_state.data  # All historical data
-    last_two_weeks_start = st.session_state.data["date"].iloc[-1] - timedelta(days=14)
-    mondays = full_data["date"][full_data["date"].dt.weekday == 0]
-    
-    # plot view with tabs 
+    #st.write(history.tail(5))
+    #st.write(history.to_frame()) # or all entries
+
+    # plot view with tabs, only the open tab's chart is built (once per history version and language, see foodwaste_demo_charts.py)
     sales_tab, weather_tab = st.tabs([
         get_localized_string("salesHistory", st.session_state.language),
         get_localized_string("weatherHistory", st.session_state.language)
-    ])
-
-    with sales_tab:
-        # sales plot
-        fig_sales = px.line(
-            full_data,
-            x="date",
-            y=["sales", "order"],
-            labels={
-                "date": get_localized_string("dateAxis", st.session_state.language),
-                "sales": get_localized_string("salesAxis", st.session_state.language),
-                "order": get_localized_string("orderAxis", st.session_state.language),
-            },
-            title=get_localized_string("salesHistory", st.session_state.language),
-        )
-        # week separators 
-        fig_sales.update_layout(
-            shapes=[
-                dict(
-                    type="line",
-                    x0=monday,
-                    x1=monday,
-                    y0=full_data["sales"].min(),
-                    y1=full_data["sales"].max(),
-                    line=dict(color="lightgrey", width=1, dash="dot"),
-                )
-                for monday in mondays
-            ],
-            xaxis=dict(
-                rangeslider=dict(visible=True),
-                type="date",
-                range=[last_two_weeks_start, st.session_state.data["date"].iloc[-1]],
-            ),
-            yaxis=dict(fixedrange=True),
-        )
-        # show chart
-        st.plotly_chart(fig_sales, use_container_width=True)
-
-    with weather_tab:
-        # weather plot
-        fig_temp = px.line(
-            full_data,
-            x="date",
-            y="temperature",
-            labels={
-                "date": get_localized_string("dateAxis", st.session_state.language),
-                "temperature": get_localized_string("temperatureAxis", st.session_state.language),
-            },
-            title=get_localized_string("weatherHistory", st.session_state.language),
-        )
-        # week separators
-        fig_temp.update_layout(
-            shapes=[
-                dict(
-                    type="line",
-                    x0=monday,
-                    x1=monday,
-                    y0=full_data["temperature"].min(),
-                    y1=full_data["temperature"].max(),
-                    line=dict(color="lightgrey", width=1, dash="dot"),
-                )
-                for monday in mondays
-            ],
-            xaxis=dict(
-                rangeslider=dict(visible=True),
-                type="date",
-                range=[last_two_weeks_start, st.session_state.data["date"].iloc[-1]],
-            ),
-            yaxis=dict(fixedrange=True),
-        )
-        # add weather icons 
-        weather_subset = full_data
-        fig_temp.add_trace(
-            go.Scatter(
-                x=weather_subset["date"],
-                y=[full_data["temperature"].min()] * len(weather_subset), # all at 0°C
-                text=weather_subset["weather"],
-                mode="text", 
-                textposition="top center",
-                textfont=dict(size=16), # icon size
-                name=get_localized_string("weatherAxis", st.session_state.language)
-            )
-        )
-        # show chart
-        st.plotly_chart(fig_temp, use_container_width=True)
+    ], key="history_tab", on_change="rerun")
+
+    if sales_tab.open:
+        with sales_tab:
+            st.plotly_chart(get_chart(history, "sales", st.session_state.language), use_container_width=True)
+
+    if weather_tab.open:
+        with weather_tab:
+            st.plotly_chart(get_chart(history, "weather", st.session_state.language), use_container_width=True)
+
+
+# --- KEY FIGURES VIEW ---
+
+# computed from the weekly and monthly rollups of the history, so they cost O(weeks) instead of O(days)
+if st.session_state.show_kpis:
+    st.subheader(get_localized_string("kpiTitle", st.session_state.language))
+    kpis, previous_kpis = get_kpis(history)
+    profit_col, waste_col, waste_rate_col, missed_col = st.columns(4)
+    profit_col.metric(get_localized_string("kpiProfit", st.session_state.language), f"€{kpis["profit"]:,}", f"{kpis["profit"] - previous_kpis["profit"]:+,}")
+    waste_col.metric(get_localized_string("kpiWaste", st.session_state.language), kpis["leftover"], kpis["leftover"] - previous_kpis["leftover"], delta_color="inverse")
+    waste_rate_col.metric(get_localized_string("kpiWasteRate", st.session_state.language), f"{kpis["waste_rate"]:.1%}", f"{100 * (kpis["waste_rate"] - previous_kpis["waste_rate"]):+.1f} pp", delta_color="inverse")
+    missed_col.metric(get_localized_string("resultmissed", st.session_state.language), kpis["missed"], kpis["missed"] - previous_kpis["missed"], delta_color="inverse")
+    st.caption(get_localized_string("kpiPeriod", st.session_state.language))
+    st.plotly_chart(get_chart(history, "profit", st.session_state.language), use_container_width=True)
 
 
 # --- ORDERING TILE ---
@@ -229,8 +201,7 @@ with ordering_col:
     if st.button(get_localized_string("endday", st.session_state.language)):
 
         actual_sales = st.session_state.tomorrow_info["sales"]
-        leftover = max(ordered_cakes - actual_sales, 0)
-        missed = max(actual_sales - ordered_cakes, 0)
+        leftover, missed, budget_delta = map(int, get_order_results(ordered_cakes, actual_sales))
         unexpected_event = st.session_state.tomorrow_info["unexpected"]
 
         # End current day and update history
@@ -238,18 +209,16 @@ with ordering_col:
         current_day["order"] = ordered_cakes
         current_day["leftover"] = leftover
         current_day["missed"] = missed
-        new_row = pd.DataFrame(current_day, index=[st.session_state.data.index[-1] + 1])
-        st.session_state.data = pd.concat([st.session_state.data, new_row])
+        history.append(current_day)
+        training_scheduler.warm(history)
 
-        # Update Budget according to order 
-        cost_of_order = ordered_cakes * 2  # €2 per cake
-        cakes_sold = ordered_cakes - leftover
-        revenue_from_sales = cakes_sold * 3  # €3 per cake
-        st.session_state.budget += revenue_from_sales - cost_of_order
+        # Update Budget according to order (€2 per ordered cake, €3 per sold cake)
+        st.session_state.budget += budget_delta
 
         # Generate a new tomorrow
-        st.session_state.tomorrow_info = generate_tomorrow(st.session_state.data, st.session_state.language)
+        st.session_state.tomorrow_info = generate_tomorrow(history, st.session_state.holiday_subdiv)
         st.session_state.summary = (actual_sales, leftover, missed, unexpected_event)
+        st.session_state.pop("fast_forward_summary", None)
 
         # And update the interface (below) to show effects
         st.session_state.order_prediction = 0 # reset prediction
@@ -259,7 +228,8 @@ with ordering_col:
 with ai_col:
 
     if st.button("<- " + get_localized_string("aiHelp", st.session_state.language)):
-        predicted_order, prediction_explanation = predict_tomorrow_sales_with(st.session_state.data, st.session_state.tomorrow_info, st.session_state.ai_model, st.session_state.language)
+        model_type = get_model_type(st.session_state.ai_model, st.session_state.language)
+        predicted_order, prediction_explanation = training_scheduler.predict(history, st.session_state.tomorrow_info, model_type, st.session_state.language, optimize_profit=st.session_state.optimize_profit)
         st.session_state.order_prediction = int(predicted_order) # Store prediction as int
         st.session_state.prediction_explanation = prediction_explanation # Store explanation
         rerun_later = True
@@ -272,9 +242,37 @@ with ai_col:
             get_localized_string("modelXGB", st.session_state.language),
         ],
     )
+    model_status = training_scheduler.status(history, get_model_type(st.session_state.ai_model, st.session_state.language))
+    st.caption(get_localized_string("modelStatus", st.session_state.language) + ": " + get_localized_string("modelStatus" + model_status.capitalize(), st.session_state.language))
 
+    st.session_state.optimize_profit = st.toggle(get_localized_string("optimizeProfit", st.session_state.language), value=st.session_state.optimize_profit)
     st.session_state.show_ai_explanation = st.toggle(get_localized_string("explainButton", st.session_state.language), value=st.session_state.show_ai_explanation)
 
+# --- FAST-FORWARD: play many days at once with the selected model ---
+
+with ordering_tile.expander(get_localized_string("fastForward", st.session_state.language)):
+    st.caption(get_localized_string("fastForwardInfo", st.session_state.language))
+    fast_forward_days_col, fast_forward_button_col = st.columns([1, 1], vertical_alignment="bottom")
+    with fast_forward_days_col:
+        fast_forward_days = st.number_input(get_localized_string("fastForwardDays", st.session_state.language), min_value=1, max_value=365, value=7, step=1)
+    with fast_forward_button_col:
+        if st.button(get_localized_string("fastForwardButton", st.session_state.language)):
+            model_type = get_model_type(st.session_state.ai_model, st.session_state.language)
+            played_days, st.session_state.tomorrow_info = fast_forward(
+                history, st.session_state.tomorrow_info, int(fast_forward_days), model_type,
+                optimize_profit=st.session_state.optimize_profit, subdiv=st.session_state.holiday_subdiv,
+            )
+            training_scheduler.warm(history)
+
+            # Update budget and show the last played day, plus totals of all played days
+            st.session_state.budget += int(played_days["budget_delta"].sum())
+            last_day = played_days.iloc[-1]
+            st.session_state.summary = (int(last_day["sales"]), int(last_day["leftover"]), int(last_day["missed"]), str(last_day["unexpected"]))
+            st.session_state.fast_forward_summary = (len(played_days), int(played_days["sales"].sum()), int(played_days["leftover"].sum()), int(played_days["missed"].sum()), int(played_days["budget_delta"].sum()))
+            st.session_state.order_prediction = 0 # reset prediction
+            st.session_state.prediction_explanation =  None # reset explanation
+            rerun_later = True
+
 
 # --- SHOW AI EXPLANATION IF AVAILABLE ---
 
@@ -284,15 +282,22 @@ if st.session_state.show_ai_explanation:
         st.subheader(get_localized_string("modelExplanation", st.session_state.language))
         if st.session_state.prediction_explanation:
             # show basic model explanation
+            if st.session_state.prediction_explanation.get("fallback_from"):
+                st.caption(get_localized_string("modelFallback", st.session_state.language))
             st.write(get_localized_string(st.session_state.prediction_explanation.get("model_info"), st.session_state.language))
+            # show how the order was derived from the forecast, if optimized for profit
+            if st.session_state.prediction_explanation.get("order_info"):
+                st.write(get_localized_string(st.session_state.prediction_explanation.get("order_info"), st.session_state.language))
+                st.caption(f"{get_localized_string("forecastSales", st.session_state.language)}: {int(st.session_state.prediction_explanation.get("forecast"))}")
             # show reference days, if available 
             ref_days = st.session_state.prediction_explanation.get("reference_days")
             if ref_days:
+                ref_weekdays = localize_column([ref_day.get("dayofweek") for ref_day in ref_days], st.session_state.language) # each weekday translated once
                 ref_day_cols = explanation_tile.columns([1 for ref_day in ref_days], vertical_alignment="top")
                 for idx, col in enumerate(ref_day_cols):
                     with col:
                         st.write(f"- {str(ref_days[idx].get("date"))[:10]}" + "\n" + \
-                            f"- {get_localized_string(ref_days[idx].get("dayofweek"), st.session_state.language)}" + "\n" + \
+                            f"- {ref_weekdays[idx]}" + "\n" + \
                             f"- {get_localized_string("sales", st.session_state.language)}: {ref_days[idx].get("sales")}" + "\n" + \
                             f"- {get_localized_string("weather", st.session_state.language)}: {ref_days[idx].get("weather")}" + "\n" + \
                             f"- {get_localized_string("temperature", st.session_state.language)}: {ref_days[idx].get("temperature")} °C" + "\n" + \
@@ -315,15 +320,22 @@ if "summary" in st.session_state:
     summary_tile = st.container(border=True)
     with summary_tile:
         st.subheader(get_localized_string("resultsummary", st.session_state.language))
+        if "fast_forward_summary" in st.session_state:
+            played, sold, leftover_total, missed_total, budget_total = st.session_state.fast_forward_summary
+            st.info(f"{get_localized_string("fastForwardSummary", st.session_state.language)}: {played} {get_localized_string("days", st.session_state.language)}" + "\n" + \
+                f"- {get_localized_string("resultsold", st.session_state.language)}: {sold}" + "\n" + \
+                f"- {get_localized_string("resultleftover", st.session_state.language)}: {leftover_total}" + "\n" + \
+                f"- {get_localized_string("resultmissed", st.session_state.language)}: {missed_total}" + "\n" + \
+                f"- Budget: €{budget_total:+,.2f}")
     result_col, feedback_col = summary_tile.columns([1, 1], vertical_alignment="center")
 
     with result_col:
         # TODO maybe turn into a table for better viewing
-        result_string = f"- {get_localized_string("orderAxis", st.session_state.language)}: {st.session_state.data["order"].values[-1]}" + "\n" + \
+        result_string = f"- {get_localized_string("orderAxis", st.session_state.language)}: {history.last()["order"]}" + "\n" + \
             f"- {get_localized_string("resultsold", st.session_state.language)}: {actual_sales}" + "\n" + \
             f"- {get_localized_string("resultleftover", st.session_state.language)}: {leftover}" + "\n" + \
             f"- {get_localized_string("resultmissed", st.session_state.language)}: {missed}" + \
-            (("\n" + f"- ⚠️ {get_localized_string("unexpectedevent", st.session_state.language)} - {unexpected_event}") if unexpected_event != "" else "")
+            (("\n" + f"- ⚠️ {get_localized_string("unexpectedevent", st.session_state.language)} - {get_localized_string(unexpected_event, st.session_state.language)}") if unexpected_event != "" else "")
         st.write(result_string)
         
     with feedback_col:
@@ -338,3 +350,32 @@ if "summary" in st.session_state:
         else:
             st.success(get_localized_string("feedbackJustRight", st.session_state.language))
 
+# --- AFTER RENDERING ---
+
+# Only now start background work, so it does not delay the page: train all models (no-op if already done
+# for this version, until then predictions fall back to the heuristic) and import the AI and chart backends
+record_first_render()
+training_scheduler.warm(history)
+preload_backends()
+
+if st.session_state.show_info:
+    startup_report = get_startup_report()
+    st.sidebar.caption(
+        f"{get_localized_string("startupFirstRender", st.session_state.language)}: {startup_report["first_render"]:.2f} s" + "\n\n" + \
+        f"{get_localized_string("startupImports", st.session_state.language)}: " + (", ".join(f"{name} {seconds:.2f} s" for name, seconds in startup_report["imports"].items()) or "-")
+    )
+
+# --- METRICS ---
+
+# Timings of this rerun are appended to the metrics file (if configured), and shown in the sidebar in debug mode
+rerun_metrics = metrics.end_rerun()
+metrics.export_rerun(rerun_metrics, session=history.id)
+
+if metrics.DEBUG:
+    with st.sidebar.expander(get_localized_string("debugPanel", st.session_state.language)):
+        st.caption(f"{get_localized_string("debugRerun", st.session_state.language)}: {rerun_metrics["seconds"]:.3f} s")
+        st.dataframe(pd.DataFrame(rerun_metrics["spans"]).T, use_container_width=True)
+        snapshot = metrics.get_snapshot()
+        st.caption(get_localized_string("debugProcess", st.session_state.language))
+        st.dataframe(pd.DataFrame(snapshot["spans"]).T, use_container_width=True)
+        st.json({"counters": snapshot["counters"], "gauges": snapshot["gauges"]}, expanded=False)
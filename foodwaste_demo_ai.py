@@ -1,20 +1,23 @@
 
+from collections import OrderedDict
+import copy
+import logging
+import pickle
+import threading
+import warnings
+
 import numpy as np
 import pandas as pd
 
 from foodwaste_demo_strings import * 
+from foodwaste_demo_syntheticdata import CRITICAL_RATIO
+from foodwaste_demo_history import HistoryStore, PanelHistory, WeekdayIndex, predict_weekday_averages, FEATURES, DAY_FEATURES, LAG_FEATURES, WEEKDAY_WINDOW, as_days, featurize_days
+from foodwaste_demo_startup import import_backend
+from foodwaste_demo_metrics import add_gauge, count, timed
 
-from sklearn.preprocessing import LabelEncoder
-from sklearn.neighbors import KNeighborsRegressor
-import xgboost as xgb
-
-# Global variables to store trained models and helpers
-weather_encoder = LabelEncoder()
-daytype_encoder = LabelEncoder()
-knn_model = None
-xgb_model = None
+logger = logging.getLogger("foodwaste_demo.ai")
 
-# data has columns = ["date", "dayofweek", "order", "sales", "leftover", "missed", "weather", "temperature", "daytype", "unexpected"]
+# data has columns = ["date", "dayofweek", "order", "sales", "leftover", "missed", "weather", "temperature", "daytype", "unexpected"] (types in HISTORY_DTYPES)
 # tomorrow has key/value pairs = {
 #     "date": tomorrow_date, 
 #     "dayofweek": tomorrow_date.strftime("%A"), 
@@ -30,44 +33,287 @@ xgb_model = None
 
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
 
-def preprocess_data(data):
+def as_frame(data):
     """
-    Convert categorical features into numerical representations.
+    Returns history data as pd.DataFrame, accepting a HistoryStore as well (its view is cached per version).
     """
-    # Encode weather and daytype as categorical numerical values
-    data["weather_num"] = weather_encoder.fit_transform(data["weather"])
-    data["daytype_num"] = daytype_encoder.fit_transform(data["daytype"])
-    
-    # Convert dayofweek to a cyclic feature (sin transformation)
-    data["dayofweek_num"] = pd.to_datetime(data["date"]).dt.weekday
-    data["dayofweek_sin"] = np.sin(2 * np.pi * data["dayofweek_num"] / 7)
-    
-    return data
+    return data.to_frame() if isinstance(data, HistoryStore) else data
+
+# Bytes of a tree node of an XGBoost booster in memory (split, leaf value and statistics), see estimate_xgb_size
+XGB_NODE_BYTES = 40
+
+def estimate_xgb_size(xgb_model):
+    """
+    Returns an upper bound of the size of an XGBoost model in bytes, from its number of trees (one per round
+    and quantile) and the nodes a tree of its max_depth can have at most, without serializing the booster.
+    """
+    params = xgb_model.get_params()
+    trees = xgb_model.get_booster().num_boosted_rounds() * max(np.size(params.get("quantile_alpha", 1)), 1)
+    return trees * (2 ** ((params.get("max_depth") or 6) + 1) - 1) * XGB_NODE_BYTES
+
+def estimate_size(obj):
+    """
+    Returns the approximate size of a model in bytes, without serializing it: the bytes of its NumPy arrays
+    and pandas objects, XGBoost models by their number of trees (see estimate_xgb_size), containers and
+    plain objects by their contents. Small values count 8 bytes each.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(index=False)))
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(estimate_size(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_size(value) for value in obj)
+    if hasattr(obj, "get_booster"):
+        return estimate_xgb_size(obj)
+    if hasattr(obj, "__dict__"):
+        return estimate_size(vars(obj))
+    return 8
+
+class ModelRegistry:
+    """
+    Thread-safe LRU cache of trained models.
+    Models are keyed by (dataset id, data version, model type, hyperparameters), so a model is
+    reused as long as its data has not changed, and sessions (datasets) never share models.
+    Least recently used models are evicted beyond max_entries or max_bytes.
+    Models of datasets registered with persist are also written to (and lazily loaded from) disk.
+    Hits and misses are also counted as metrics, named after the registry (see foodwaste_demo_metrics.py).
+    Sizes are estimated by sizeof (estimate_size by default), unless given on put.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024, name="models", sizeof=estimate_size):
+        self.name = name
+        self.sizeof = sizeof
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._models = OrderedDict()  # key -> (model, size in bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._training_locks = {}  # key -> lock, so concurrent requests train a model only once
+        self._stores = {}  # dataset id -> ModelStore (see foodwaste_demo_persistence.py)
+
+    def __len__(self):
+        return len(self._models)
+
+    def persist(self, dataset_id, store):
+        """Persists the models of a dataset in a ModelStore: models put for it are saved there,
+        and loaded from there when not in memory, e.g. after a restart or in another worker."""
+        with self._lock:
+            self._stores[dataset_id] = store
+
+    def get(self, key):
+        """Returns the model stored for key (marking it as recently used) or None."""
+        with self._lock:
+            if key in self._models:
+                self.hits += 1
+                count(self.name + ".hits")
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            store = self._stores.get(key[0])
+        loaded = store.load(key) if store is not None else None
+        with self._lock:
+            if loaded is None:
+                self.misses += 1
+                count(self.name + ".misses")
+                return None
+            self.hits += 1
+        count(self.name + ".loads")
+        model, size = loaded
+        self.put(key, model, size, save=False)
+        return model
+
+    def put(self, key, model, size=None, save=True):
+        """Stores a model of size bytes (estimated by sizeof if not given), evicting least recently used models
+        if limits are exceeded. If the model's dataset is persisted, the model is saved to disk as well (unless save is False)."""
+        store = self._stores.get(key[0]) if save else None
+        if store is not None:
+            data = pickle.dumps(model)
+            store.save(key, data)
+            size = len(data) if size is None else size
+        size = self.sizeof(model) if size is None else size
+        with self._lock:
+            if key in self._models:
+                self._total_bytes -= self._models.pop(key)[1]
+            self._models[key] = (model, size)
+            self._total_bytes += size
+            while len(self._models) > 1 and (len(self._models) > self.max_entries or self._total_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._models.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def get_or_train(self, key, train):
+        """Returns the model for key, calling train() to create and store it if needed."""
+        model = self.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            training_lock = self._training_locks.setdefault(key, threading.Lock())
+        with training_lock:
+            with self._lock:
+                model = self._models[key][0] if key in self._models else None
+            if model is None:
+                model = train()
+                self.put(key, model)
+        with self._lock:
+            self._training_locks.pop(key, None)
+        return model
+
+    def stats(self):
+        """Returns number and total size of the stored models, and hits and misses so far."""
+        with self._lock:
+            return {"entries": len(self._models), "bytes": self._total_bytes, "hits": self.hits, "misses": self.misses}
+
+    def pop(self, key):
+        """Removes and returns the model stored for key, or None."""
+        with self._lock:
+            if key not in self._models:
+                return None
+            model, size = self._models.pop(key)
+            self._total_bytes -= size
+            return model
+
+    def take_latest(self, dataset_id, model_type, hyperparameters, before):
+        """Removes and returns (key, model) of the newest stored version of a model for a dataset older than
+        version before, or (None, None). Finding and removing is atomic, so only one caller gets the model,
+        e.g. to update it in place."""
+        with self._lock:
+            candidates = [key for key in self._models if key[0] == dataset_id and key[2:] == (model_type, hyperparameters) and key[1] < before]
+            if not candidates:
+                return None, None
+            key = max(candidates, key=lambda candidate: candidate[1])
+            model, size = self._models.pop(key)
+            self._total_bytes -= size
+            return key, model
+
+    def clear(self):
+        """Removes all models."""
+        with self._lock:
+            self._models.clear()
+            self._total_bytes = 0
+
+# Trained models of all sessions
+model_registry = ModelRegistry()
+add_gauge(model_registry.name, model_registry.stats)
+
+def get_data_key(data):
+    """
+    Returns (dataset id, data version) identifying the current state of history data.
+    HistoryStores and PanelHistories carry both, DataFrames are identified by a hash of their content.
+    """
+    if isinstance(data, HistoryStore):
+        return data.data_key
+    if isinstance(data, PanelHistory):
+        return data.id, data.version
+    content_hash = pd.util.hash_pandas_object(data[["date", "sales", "weather", "temperature", "daytype"]], index=False)
+    return "frame-" + format(int(content_hash.sum()) & 0xFFFFFFFFFFFFFFFF, "x"), len(data)
+
+def get_model_key(data, model_type, **hyperparameters):
+    """
+    Returns the model registry key for a model type trained with hyperparameters on data.
+    """
+    return (*get_data_key(data), model_type, tuple(sorted(hyperparameters.items())))
+
+def get_or_update_model(data, model_type, train, update, **hyperparameters):
+    """
+    Returns the model for the current version of data from the registry.
+    If only a model of an older version of the same HistoryStore (or PanelHistory) is available, it is updated
+    incrementally with the days appended since (update returns None if a full refit is needed). A copy of the
+    model of the base a HistoryStore was forked from is updated alike, e.g. the shared base history's models.
+    Otherwise, the model is trained from scratch.
+    """
+    key = get_model_key(data, model_type, **hyperparameters)
+    trained = model_registry.get(key)
+    if trained is not None:
+        return trained
+    if isinstance(data, (HistoryStore, PanelHistory)):
+        # taken out of the registry, as updates may modify the previous model in place
+        _, previous = model_registry.take_latest(key[0], model_type, key[3], before=key[1])
+        if previous is not None:
+            trained = update(previous, data)
+            if trained is not None:
+                model_registry.put(key, trained)
+                return trained
+        elif isinstance(data, HistoryStore) and data.base_key not in (None, key[:2]):
+            base_trained = model_registry.get((*data.base_key, *key[2:]))
+            trained = update(copy.deepcopy(base_trained), data) if base_trained is not None else None
+            if trained is not None:
+                model_registry.put(key, trained)
+                return trained
+    return model_registry.get_or_train(key, train)
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Features per model: the KNN distance is unscaled, so sales-sized lag features would dominate it
+# (walk-forward backtests: MAE about 51 with DAY_FEATURES vs. 85 with all), XGBoost gains from all
+# (MAE about 34 vs. 37); other choices can be given as the features hyperparameter
+KNN_FEATURES = tuple(DAY_FEATURES)
+XGB_FEATURES = tuple(FEATURES)
+
+def get_feature_columns(features):
+    """Returns the column indices of the given feature names in the FEATURES matrix."""
+    return [FEATURES.index(name) for name in features]
+
+@timed("features")
+def get_training_data(data, start=0, features=FEATURES):
+    """
+    Returns model features and sales of the days from start on, as np.ndarrays.
+    HistoryStores maintain their feature matrix incrementally, DataFrames are featurized here.
+    """
+    store = data if isinstance(data, HistoryStore) else HistoryStore.from_frame(data)
+    return store.features()[start:, get_feature_columns(features)], store.codes("sales")[start:].astype(float)
+
+def get_next_features(data, days, features=FEATURES):
+    """
+    Returns model features of the next days after data (e.g. tomorrow given as dict, or the next week
+    as DataFrame), as np.ndarray with one row per day. See HistoryStore.next_features.
+    """
+    store = data if isinstance(data, HistoryStore) else HistoryStore.from_frame(data.tail(WEEKDAY_WINDOW))
+    return store.next_features(days)[:, get_feature_columns(features)]
 
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
 
-def get_heuristic_prediction(data, tomorrow, language, k=4):
+def get_weekday_index(data):
+    """
+    Returns the WeekdayIndex of history data: maintained by a HistoryStore, built for a DataFrame.
+    """
+    if isinstance(data, HistoryStore):
+        return data.weekday_index
+    weekday_index = WeekdayIndex()
+    weekday_index.add_many(pd.to_datetime(data["date"]).dt.weekday.to_numpy(), data["sales"].to_numpy(dtype=float), np.arange(len(data)))
+    return weekday_index
+
+def get_heuristic_reference_days(data, weekday, k=4, weekday_index=None):
+    """
+    Returns the last k days of a weekday (0 = Monday) in history data, as pd.DataFrame.
+    """
+    _, reference_rows = (weekday_index or get_weekday_index(data)).latest(weekday, k)
+    return data.rows(reference_rows) if isinstance(data, HistoryStore) else data.iloc[reference_rows]
+
+def get_heuristic_prediction(data, tomorrow, language, k=4, decay=None):
     """
     Predict tomorrow's sales using a simple heuristic: 
     Average sales of the last k occurrences of the same weekday.
     Args:
-        data (pd.DataFrame): Historical sales data with required columns.
+        data (pd.DataFrame or HistoryStore): Historical sales data with required columns.
         tomorrow (dict): Dictionary containing tomorrow's details.
         language (str): language for outputs
         k (int): Number of past occurrences to consider for averaging.
+        decay (float): If given, weight the i-th latest occurrence by decay**i (exponential decay).
     Returns:
         Prediction sales estimate and explanation dict
     """
 
-    # Filter data for the same weekday as tomorrow
-    tomorrow_dayofweek = get_localized_string(tomorrow["dayofweek"], "Deutsch") # data entries default to german daysofweek
-    weekday_data = data[data["dayofweek"] == tomorrow_dayofweek]
-    
-    # Take the last k same weekdays
-    reference_days = weekday_data.sort_values(by="date").tail(k)
+    # Take the last k same weekdays as tomorrow from the weekday index
+    weekday_index = get_weekday_index(data)
+    tomorrow_weekday = pd.Timestamp(tomorrow["date"]).weekday()
+    reference_days = get_heuristic_reference_days(data, tomorrow_weekday, k, weekday_index)
     
     # Compute the heuristic sales prediction
-    predicted_sales = reference_days["sales"].mean()
+    predicted_sales = weekday_index.predict([tomorrow_weekday], k, decay)[0]
 
     # Build explanation 
     prediction_explanation = {
@@ -78,131 +324,487 @@ def get_heuristic_prediction(data, tomorrow, language, k=4):
     # Return results
     return predicted_sales, prediction_explanation
 
+def get_heuristic_predictions(data, dates, k=4, decay=None):
+    """
+    Predict sales of many dates at once with the heuristic (from the current history, without updates in between).
+    Args:
+        data (pd.DataFrame, HistoryStore or list of them): Historical sales data, e.g. one per store.
+        dates (list): Dates to predict.
+    Returns:
+        np.ndarray of predictions, of shape (dates,) or (stores, dates) for a list of histories.
+    """
+    weekdays = pd.DatetimeIndex(dates).weekday.to_numpy()
+    if not isinstance(data, list):
+        return get_weekday_index(data).predict(weekdays, k, decay)
+    weekday_indexes = [get_weekday_index(store_data) for store_data in data]
+    sales = np.stack([weekday_index.sales for weekday_index in weekday_indexes])
+    counts = np.stack([weekday_index.counts for weekday_index in weekday_indexes])
+    return predict_weekday_averages(sales, counts, np.tile(weekdays, (len(data), 1)), k, decay)
+
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
 
-def train_knn_model(data, k=4):
+class IncrementalKNN:
     """
-    Train and store a KNN regressor model using historical sales data.
+    k-nearest-neighbors regressor whose neighbor index can grow sample by sample.
+    Uses brute-force search (like KNeighborsRegressor with algorithm="brute") over
+    preallocated arrays with capacity doubling, so adding a sample is amortized O(1).
     """
-    global knn_model
-    
-    data = preprocess_data(data.copy())
-    features = ["dayofweek_num", "dayofweek_sin", "weather_num", "temperature", "daytype_num"]
-    X = data[features]
-    y = data["sales"]
+
+    def __init__(self, n_neighbors=4):
+        self.n_neighbors = n_neighbors
+        self._X = np.empty((0, 0))
+        self._y = np.empty(0)
+        self._size = 0
+
+    def fit(self, X, y):
+        """Builds the index from scratch."""
+        self._X = np.empty((0, np.shape(X)[1]))
+        self._y = np.empty(0)
+        self._size = 0
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        """Appends samples to the index."""
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        size = self._size + len(X)
+        if size > len(self._X):
+            capacity = max(2 * len(self._X), size, 64)
+            self._X = np.concatenate([self._X[:self._size], np.empty((capacity - self._size, X.shape[1]))])
+            self._y = np.concatenate([self._y[:self._size], np.empty(capacity - self._size)])
+        self._X[self._size:size] = X
+        self._y[self._size:size] = y
+        self._size = size
+        return self
+
+    def kneighbors(self, X, return_distance=True, n_neighbors=None):
+        """Returns (distances and) indices of the nearest samples, closest first."""
+        X = np.asarray(X, dtype=float)
+        k = min(n_neighbors or self.n_neighbors, self._size)
+        distances = np.sqrt(((X[:, None, :] - self._X[None, :self._size, :]) ** 2).sum(axis=2))
+        indices = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        if return_distance:
+            return np.take_along_axis(distances, indices, axis=1), indices
+        return indices
+
+    def targets(self, indices):
+        """Returns the targets of samples, e.g. of the nearest ones found by kneighbors."""
+        return self._y[:self._size][indices]
+
+    def predict(self, X):
+        """Predicts the mean target of the nearest samples."""
+        return self._y[:self._size][self.kneighbors(X, return_distance=False)].mean(axis=1)
+
+@timed("train/knn")
+def train_knn_model(data, k=4, features=KNN_FEATURES):
+    """
+    Train a KNN regressor model using historical sales data.
+    Returns the model together with the number of days it was trained on, as dict.
+    """
+    X, y = get_training_data(data, features=features)
     
-    knn_model = KNeighborsRegressor(n_neighbors=k)
+    knn_model = IncrementalKNN(n_neighbors=k)
     knn_model.fit(X, y)
+    return {"model": knn_model, "features": features, "n_rows": len(X), "updates": 0}
 
-def get_knn_prediction(data, tomorrow, language, k=4):
+@timed("update/knn")
+def update_knn_model(trained, data):
     """
-    Predict tomorrow's sales using a KNN regressor.
+    Append the days added to data since training to the KNN neighbor index.
+    Returns the updated model dict.
+    """
+    X_new, y_new = get_training_data(data, trained["n_rows"], trained["features"])
+    trained["model"].partial_fit(X_new, y_new)
+    return {**trained, "n_rows": trained["n_rows"] + len(X_new), "updates": trained["updates"] + 1}
+
+def get_knn_model(data, k=4, features=KNN_FEATURES):
+    """
+    Returns the KNN model for the current version of data: cached, updated or newly trained.
+    """
+    return get_or_update_model(data, "knn", lambda: train_knn_model(data, k, features), update_knn_model, k=k, features=features)
+
+def get_knn_predictions(data, days, k=4, features=KNN_FEATURES):
+    """
+    Predict sales of the next days after data (e.g. the next week) using a KNN regressor,
+    with a single neighbor search for all days.
     
     Args:
-        data (pd.DataFrame): Historical sales data.
-        tomorrow (dict): Dictionary containing tomorrow's details.
-        language (str): Language for outputs.
+        data (pd.DataFrame or HistoryStore): Historical sales data.
+        days (pd.DataFrame or list of dicts): Consecutive days after data, see HistoryStore.next_features.
         k (int): Number of neighbors for KNN.
+        features (tuple): Names of the FEATURES to find neighbors by.
     
     Returns:
-        Prediction sales estimate and explanation dict.
+        Prediction sales estimates (np.ndarray) and explanation dicts (list), one per day.
     """
-    global knn_model
-    
-    # Ensure the model is trained
-    if knn_model is None:
-        train_knn_model(data, k)
+    trained = get_knn_model(data, k, features)
+    knn_model = trained["model"]
     
     # Prepare input data for prediction
-    tomorrow_processed = {
-        "dayofweek_num": pd.to_datetime(tomorrow["date"]).weekday(),
-        "dayofweek_sin": np.sin(2 * np.pi * pd.to_datetime(tomorrow["date"]).weekday() / 7),
-        "weather_num": weather_encoder.transform([tomorrow["weather"]])[0],
-        "temperature": tomorrow["temperature"],
-        "daytype_num": daytype_encoder.transform([tomorrow["daytype"]])[0]
-    }
-    X_tomorrow = pd.DataFrame([tomorrow_processed])
+    X_days = get_next_features(data, days, trained["features"])
+    data = as_frame(data)
     
-    # Predict sales
-    predicted_sales = knn_model.predict(X_tomorrow)[0]
+    # Retrieve reference days = the k nearest neighbors, and predict their mean sales
+    neighbors_indices = knn_model.kneighbors(X_days, return_distance=False)
+    logger.debug("knn neighbors of %d days among %d days: %s", len(neighbors_indices), len(data), neighbors_indices.tolist())
+    predicted_sales = knn_model.targets(neighbors_indices).mean(axis=1)
 
-    # Retrieve reference days = the k nearest neighbors
-    neighbors_indices = knn_model.kneighbors(X_tomorrow, return_distance=False)[0]
-    print("neighbors_indices", neighbors_indices)
-    print("len(data)", len(data))
-    reference_days = data.iloc[neighbors_indices]
-
-    # Build explanation
-    prediction_explanation = {
+    # Build explanations
+    prediction_explanations = [{
         "model_info": "modelInfoKNN",
-        "reference_days": reference_days.to_dict(orient="records")
-    }
+        "reference_days": data.iloc[day_neighbors_indices].to_dict(orient="records")
+    } for day_neighbors_indices in neighbors_indices]
     
-    return predicted_sales, prediction_explanation
+    return predicted_sales, prediction_explanations
+
+def get_knn_prediction(data, tomorrow, language, k=4, features=KNN_FEATURES):
+    """
+    Predict tomorrow's sales using a KNN regressor.
+    
+    Args:
+        data (pd.DataFrame or HistoryStore): Historical sales data.
+        tomorrow (dict): Dictionary containing tomorrow's details.
+        language (str): Language for outputs.
+        k (int): Number of neighbors for KNN.
+        features (tuple): Names of the FEATURES to find neighbors by.
+    
+    Returns:
+        Prediction sales estimate and explanation dict.
+    """
+    predicted_sales, prediction_explanations = get_knn_predictions(data, [tomorrow], k, features)
+    return predicted_sales[0], prediction_explanations[0]
 
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
 
-def train_xgb_model(data):
+def get_xgb():
     """
-    Train and store an XGBoost model using historical sales data.
+    Returns the xgboost module, imported on first use only, as importing it takes long (see foodwaste_demo_startup.py).
     """
-    global xgb_model
-    
-    data = preprocess_data(data)
-    features = ["dayofweek_num", "dayofweek_sin", "weather_num", "temperature", "daytype_num"]
-    X = data[features]
-    y = data["sales"]
+    return import_backend("xgboost")
+
+# Threads XGBoost trains and predicts with, None for all cores; set to 1 in worker processes of a pool
+XGB_THREADS = None
+
+def get_xgb_params(quantiles=None):
+    """
+    Returns the XGBoost objective parameters: squared error for mean forecasts, or the quantile
+    (pinball) loss to forecast the given quantiles of sales at once, with XGB_THREADS as n_jobs.
+    """
+    if quantiles is None:
+        return {"objective": "reg:squarederror", "n_jobs": XGB_THREADS}
+    return {"objective": "reg:quantileerror", "quantile_alpha": np.asarray(quantiles), "n_jobs": XGB_THREADS}
+
+@timed("train/xgb")
+def train_xgb_model(data, n_estimators=100, features=XGB_FEATURES, quantiles=None):
+    """
+    Train an XGBoost model using historical sales data, forecasting mean sales or the given quantiles.
+    Returns the model together with the number of days it was trained on, as dict.
+    """
+    X, y = get_training_data(data, features=features)
     
-    xgb_model = xgb.XGBRegressor(objective="reg:squarederror", n_estimators=100)
+    xgb_model = get_xgb().XGBRegressor(n_estimators=n_estimators, **get_xgb_params(quantiles))
     xgb_model.fit(X, y)
+    return {"model": xgb_model, "features": features, "quantiles": quantiles, "n_rows": len(X), "updates": 0}
 
-def get_xgb_prediction(data, tomorrow, language):
+@timed("update/xgb")
+def update_xgb_model(trained, data, rounds=3, recent_days=365, refit_every=28):
     """
-    Predict tomorrow's sales using an XGBoost model.
+    Continue boosting an XGBoost model for a few rounds on the most recent days, including those
+    added to data since training. Returns the updated model dict, or None if a full refit is due
+    (every refit_every updates).
+    """
+    if trained["updates"] + 1 >= refit_every:
+        return None
+    X_recent, y_recent = get_training_data(data, max(len(data) - recent_days, 0), trained["features"])
+    xgb_model = get_xgb().XGBRegressor(n_estimators=rounds, **get_xgb_params(trained["quantiles"]))
+    xgb_model.fit(X_recent, y_recent, xgb_model=trained["model"].get_booster())
+    return {**trained, "model": xgb_model, "n_rows": len(data), "updates": trained["updates"] + 1}
+
+def get_xgb_model(data, n_estimators=100, features=XGB_FEATURES, quantiles=None):
+    """
+    Returns the XGBoost model for the current version of data: cached, updated or newly trained.
+    """
+    return get_or_update_model(
+        data, "xgb", lambda: train_xgb_model(data, n_estimators, features, quantiles), update_xgb_model,
+        n_estimators=n_estimators, features=features, quantiles=quantiles,
+    )
+
+def get_xgb_predictions(data, days, n_estimators=100, features=XGB_FEATURES):
+    """
+    Predict sales of the next days after data (e.g. the next week) using an XGBoost model,
+    with a single predict call for all days.
     
     Args:
-        data (pd.DataFrame): Historical sales data.
-        tomorrow (dict): Dictionary containing tomorrow's details.
-        language (str): Language for outputs.
+        data (pd.DataFrame or HistoryStore): Historical sales data.
+        days (pd.DataFrame or list of dicts): Consecutive days after data, see HistoryStore.next_features.
+        n_estimators (int): Number of boosting rounds.
+        features (tuple): Names of the FEATURES to train on.
     
     Returns:
-        Prediction sales estimate and explanation dict.
+        Prediction sales estimates (np.ndarray) and explanation dicts (list), one per day.
     """
-    global xgb_model
-    
-    # Ensure the model is trained
-    if xgb_model is None:
-        train_xgb_model(data)
+    trained = get_xgb_model(data, n_estimators, features)
+    xgb_model = trained["model"]
     
     # Prepare input data for prediction
-    tomorrow_processed = {
-        "dayofweek_num": pd.to_datetime(tomorrow["date"]).weekday(),
-        "dayofweek_sin": np.sin(2 * np.pi * pd.to_datetime(tomorrow["date"]).weekday() / 7),
-        "weather_num": weather_encoder.transform([tomorrow["weather"]])[0],
-        "temperature": tomorrow["temperature"],
-        "daytype_num": daytype_encoder.transform([tomorrow["daytype"]])[0]
-    }
-    X_tomorrow = pd.DataFrame([tomorrow_processed])
+    X_days = get_next_features(data, days, trained["features"])
     
     # Predict sales
-    predicted_sales = xgb_model.predict(X_tomorrow)[0]
+    predicted_sales = xgb_model.predict(X_days)
     
-    # Build explanation
-    prediction_explanation = {
-        "model_info": "modelInfoXGB",
-    }
+    # Build explanations
+    prediction_explanations = [{"model_info": "modelInfoXGB"} for _ in predicted_sales]
     
-    return predicted_sales, prediction_explanation
+    return predicted_sales, prediction_explanations
+
+def get_xgb_prediction(data, tomorrow, language, n_estimators=100, features=XGB_FEATURES):
+    """
+    Predict tomorrow's sales using an XGBoost model.
+    
+    Args:
+        data (pd.DataFrame or HistoryStore): Historical sales data.
+        tomorrow (dict): Dictionary containing tomorrow's details.
+        language (str): Language for outputs.
+        n_estimators (int): Number of boosting rounds.
+        features (tuple): Names of the FEATURES to train on.
+    
+    Returns:
+        Prediction sales estimate and explanation dict.
+    """
+    predicted_sales, prediction_explanations = get_xgb_predictions(data, [tomorrow], n_estimators, features)
+    return predicted_sales[0], prediction_explanations[0]
 
 # ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
 
-def predict_tomorrow_sales_with(data, tomorrow, model, language):
-    """Returns a dummy prediction based on the selected model."""
-    if model == get_localized_string("modelHeu", language):
-        return get_heuristic_prediction(data, tomorrow, language) # returns prediction and reference days
-    elif model == get_localized_string("modelKNN", language):
-        return get_knn_prediction(data, tomorrow, language) # returns prediction and reference days
-    elif model == get_localized_string("modelXGB", language):
-        return get_xgb_prediction(data, tomorrow, language) # returns prediction only
+# Order optimization: the newsvendor order is the CRITICAL_RATIO quantile of the demand distribution,
+# which each model forecasts in its own way (empirical weekday quantiles, neighbor sales, quantile loss)
+
+def get_optimal_orders(demand_samples, critical_ratio=CRITICAL_RATIO, axis=1):
+    """
+    Returns the profit-maximizing (newsvendor) orders, given samples of demand along axis, e.g. of shape
+    (days, samples) or (days, samples, series): the smallest order covering the demand with a probability
+    of at least critical_ratio. Missing samples (NaN) are ignored.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN samples, e.g. without history
+        return np.nan_to_num(np.nanquantile(demand_samples, critical_ratio, axis=axis, method="inverted_cdf"))
+
+def get_heuristic_demand_samples(data, days, k=8):
+    """
+    Returns the sales of the last k same weekdays of each of the next days (empirical demand distribution
+    of the heuristic), as np.ndarray of shape (days, k), NaN where there are fewer days.
+    """
+    weekdays = pd.DatetimeIndex(as_days(days)["date"]).weekday.to_numpy()
+    return get_weekday_index(data).latest_sales(weekdays, k)
+
+def get_knn_demand_samples(data, days, n_samples=12, k=4, features=KNN_FEATURES):
+    """
+    Returns the sales of the n_samples most similar past days of each of the next days (demand distribution
+    of KNN), as np.ndarray of shape (days, n_samples). The neighbor index of the KNN model with k is reused.
+    """
+    knn_model = get_knn_model(data, k, features)["model"]
+    neighbors_indices = knn_model.kneighbors(get_next_features(data, days, features), return_distance=False, n_neighbors=n_samples)
+    return knn_model.targets(neighbors_indices)
+
+def get_xgb_quantile_predictions(data, days, quantiles=(CRITICAL_RATIO,), n_estimators=100, features=XGB_FEATURES):
+    """
+    Returns the given sales quantiles of each of the next days, forecast by an XGBoost model trained with
+    the quantile loss, as np.ndarray of shape (days, quantiles).
+    """
+    trained = get_xgb_model(data, n_estimators, features, tuple(quantiles))
+    predictions = trained["model"].predict(get_next_features(data, days, features))
+    return np.reshape(predictions, (-1, len(quantiles)))
+
+def get_order_recommendations_by_type(data, days, model_type, critical_ratio=CRITICAL_RATIO):
+    """
+    Returns the profit-maximizing orders for the next days after data (np.ndarray, one per day),
+    from the demand distribution forecast by the given model type (vectorized across days).
+    """
+    if model_type == "heuristic":
+        return get_optimal_orders(get_heuristic_demand_samples(data, days), critical_ratio)
+    elif model_type == "knn":
+        return get_optimal_orders(get_knn_demand_samples(data, days), critical_ratio)
+    elif model_type == "xgb":
+        return np.maximum(np.floor(get_xgb_quantile_predictions(data, days, (critical_ratio,))[:, 0]), 0)
+    raise ValueError(f"Unknown model type '{model_type}'")
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Panel forecasts: all series (e.g. stores and products) of a PanelHistory at once, without a loop per series
+
+def get_panel_heuristic_predictions(panel, days, k=4, decay=None):
+    """
+    Predict sales of all series of a panel for the next days with the heuristic (average of the
+    last k same weekdays), as np.ndarray of shape (days, series).
+    """
+    weekdays = pd.DatetimeIndex(as_days(days)["date"]).weekday.to_numpy()
+    return panel.weekday_index.predict(weekdays, k, decay)
+
+@timed("train/panel_knn")
+def train_panel_knn_model(panel, k=4):
+    """
+    Builds the KNN neighbor index of a panel. All series share their days, and so their day features:
+    a single index over the days serves all series (its targets are the day positions).
+    """
+    knn_model = IncrementalKNN(n_neighbors=k).fit(panel.day_features(), np.arange(len(panel)))
+    return {"model": knn_model, "n_rows": len(panel), "updates": 0}
+
+def update_panel_knn_model(trained, panel):
+    """Appends the days added to the panel since training to the neighbor index."""
+    trained["model"].partial_fit(panel.day_features(trained["n_rows"]), np.arange(trained["n_rows"], len(panel)))
+    return {**trained, "n_rows": len(panel), "updates": trained["updates"] + 1}
+
+def get_panel_knn_predictions(panel, days, k=4):
+    """
+    Predict sales of all series of a panel for the next days with KNN: the mean sales of each series
+    on the k days most similar to each day (the same as a KNN per series on DAY_FEATURES).
+    Returns np.ndarray of shape (days, series).
+    """
+    trained = get_or_update_model(panel, "panel_knn", lambda: train_panel_knn_model(panel, k), update_panel_knn_model, k=k)
+    neighbors_indices = trained["model"].kneighbors(featurize_days(as_days(days)), return_distance=False)
+    return panel.codes("sales")[neighbors_indices].mean(axis=1)
+
+# Lag features measured in sales, scaled by the level of their series for the pooled panel model
+SALES_LAG_FEATURES = ["sales_lag1", "sales_lag7", "sales_lag14", "sales_mean7", "sales_std7", "sales_weekday_mean4"]
+
+def pool_panel_features(day_features, lag_features, levels):
+    """
+    Returns the features of a pooled panel model, one row per day and series (day-major): day features,
+    then lag features, sales-sized ones divided by the level (mean sales) of their series.
+    """
+    n_days, n_series = lag_features.shape[:2]
+    lag_features = lag_features.copy()
+    lag_features[..., [LAG_FEATURES.index(name) for name in SALES_LAG_FEATURES]] /= levels[:, None]
+    return np.concatenate([np.repeat(day_features, n_series, axis=0), lag_features.reshape(n_days * n_series, -1)], axis=1)
+
+@timed("train/panel_xgb")
+def train_panel_xgb_model(panel, n_estimators=100, recent_days=365, quantiles=None):
+    """
+    Train a single XGBoost model on all series of a panel (pooled over the most recent days), predicting
+    sales (or the given quantiles of sales) relative to the level of each series, so series of any size
+    share what they have in common.
+    """
+    start = max(len(panel) - recent_days, 0)
+    sales = panel.codes("sales")[start:]
+    levels = np.maximum(sales.mean(axis=0), 1)
+    X = pool_panel_features(panel.day_features(start), panel.lag_features(start), levels)
+    y = (sales / levels).ravel()
+
+    xgb_model = get_xgb().XGBRegressor(n_estimators=n_estimators, **get_xgb_params(quantiles))
+    xgb_model.fit(X, y)
+    return {"model": xgb_model, "levels": levels, "n_rows": len(panel), "updates": 0}
+
+def get_panel_xgb_predictions(panel, days, n_estimators=100, recent_days=365, quantiles=None):
+    """
+    Predict sales of all series of a panel for the next days with the pooled XGBoost model,
+    in a single predict call. Returns np.ndarray of shape (days, series), or (days, series, quantiles).
+    """
+    key = get_model_key(panel, "panel_xgb", n_estimators=n_estimators, recent_days=recent_days, quantiles=quantiles)
+    trained = model_registry.get_or_train(key, lambda: train_panel_xgb_model(panel, n_estimators, recent_days, quantiles))
+    day_features, lag_features = panel.next_features(days)
+    X_days = pool_panel_features(day_features, lag_features, trained["levels"])
+    if quantiles is None:
+        return trained["model"].predict(X_days).reshape(len(day_features), -1) * trained["levels"]
+    return trained["model"].predict(X_days).reshape(len(day_features), -1, len(quantiles)) * trained["levels"][:, None]
+
+def predict_panel_sales_by_type(panel, days, model_type):
+    """
+    Batch forecast of all series of a panel for the next days (e.g. tomorrow or the next week).
+    Args:
+        panel (PanelHistory): Historical sales data of all series.
+        days (pd.DataFrame or list of dicts): Consecutive days after the panel history, with date, weather, temperature, daytype.
+        model_type (str): 'heuristic', 'knn' or 'xgb'.
+    Returns:
+        Predictions as np.ndarray of shape (days, series).
+    """
+    if model_type == "heuristic":
+        return get_panel_heuristic_predictions(panel, days)
+    elif model_type == "knn":
+        return get_panel_knn_predictions(panel, days)
+    elif model_type == "xgb":
+        return get_panel_xgb_predictions(panel, days)
+    raise ValueError(f"Unknown model type '{model_type}'")
+
+def get_panel_order_recommendations_by_type(panel, days, model_type, critical_ratio=CRITICAL_RATIO, k=8, n_samples=12):
+    """
+    Returns the profit-maximizing orders of all series of a panel for the next days, as np.ndarray
+    of shape (days, series), see get_order_recommendations_by_type.
+    """
+    if model_type == "heuristic":
+        weekdays = pd.DatetimeIndex(as_days(days)["date"]).weekday.to_numpy()
+        return get_optimal_orders(panel.weekday_index.latest_sales(weekdays, k), critical_ratio)
+    elif model_type == "knn":
+        trained = get_or_update_model(panel, "panel_knn", lambda: train_panel_knn_model(panel), update_panel_knn_model, k=4)
+        neighbors_indices = trained["model"].kneighbors(featurize_days(as_days(days)), return_distance=False, n_neighbors=n_samples)
+        return get_optimal_orders(panel.codes("sales")[neighbors_indices], critical_ratio)
+    elif model_type == "xgb":
+        return np.maximum(np.floor(get_panel_xgb_predictions(panel, days, quantiles=(critical_ratio,))[..., 0]), 0)
+    raise ValueError(f"Unknown model type '{model_type}'")
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Model types by the string key of their name
+MODEL_TYPES = {"modelHeu": "heuristic", "modelKNN": "knn", "modelXGB": "xgb"}
+
+def get_model_type(model, language):
+    """Returns the model type ('heuristic', 'knn', 'xgb') for a localized model name, or None."""
+    for name_key, model_type in MODEL_TYPES.items():
+        if model == get_localized_string(name_key, language):
+            return model_type
+    return None
+
+def warm_model(data, model_type):
+    """Makes sure the model of the given type is ready for the current version of data."""
+    if model_type == "knn":
+        get_knn_model(data)
+    elif model_type == "xgb":
+        get_xgb_model(data)
+        get_xgb_model(data, quantiles=(CRITICAL_RATIO,)) # for order recommendations
+    # the heuristic needs no training: HistoryStores maintain its weekday index as days are appended
+
+@timed("predict")
+def predict_tomorrow_sales_by_type(data, tomorrow, model_type, language, optimize_profit=False):
+    """
+    Returns prediction and explanation of the given model type. With optimize_profit, the prediction
+    is the profit-maximizing order instead, and the sales forecast is kept in the explanation.
+    """
+    if model_type == "heuristic":
+        prediction = get_heuristic_prediction(data, tomorrow, language) # returns prediction and reference days
+    elif model_type == "knn":
+        prediction = get_knn_prediction(data, tomorrow, language) # returns prediction and reference days
+    elif model_type == "xgb":
+        prediction = get_xgb_prediction(data, tomorrow, language) # returns prediction only
     else:
         return 0 # dummy
+    if not optimize_profit:
+        return prediction
+    predicted_sales, prediction_explanation = prediction
+    order = get_order_recommendations_by_type(data, [tomorrow], model_type)[0]
+    return order, {**prediction_explanation, "order_info": "orderInfoNewsvendor", "forecast": predicted_sales}
+
+@timed("predict_batch")
+def predict_sales_by_type(data, days, model_type):
+    """
+    Batch forecast of the next days after data, e.g. the next 7-14 days for weekly order planning:
+    all days are featurized at once and each model is called once.
+    Args:
+        data (pd.DataFrame or HistoryStore): Historical sales data.
+        days (pd.DataFrame or list of dicts): Consecutive days after data, see HistoryStore.next_features.
+        model_type (str): 'heuristic', 'knn' or 'xgb'.
+    Returns:
+        Predictions (np.ndarray) and explanation dicts (list), one per day.
+    """
+    days = as_days(days)
+    if model_type == "heuristic":
+        weekdays = pd.DatetimeIndex(days["date"]).weekday
+        reference_days = {weekday: get_heuristic_reference_days(data, weekday).to_dict(orient="records") for weekday in set(weekdays)}
+        prediction_explanations = [{"model_info": "modelInfoHeuristic", "reference_days": reference_days[weekday]} for weekday in weekdays]
+        return get_heuristic_predictions(data, days["date"]), prediction_explanations
+    elif model_type == "knn":
+        return get_knn_predictions(data, days)
+    elif model_type == "xgb":
+        return get_xgb_predictions(data, days)
+    raise ValueError(f"Unknown model type '{model_type}'")
+
+def predict_tomorrow_sales_with(data, tomorrow, model, language):
+    """Returns prediction and explanation of the selected (localized) model."""
+    return predict_tomorrow_sales_by_type(data, tomorrow, get_model_type(model, language), language)
@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from foodwaste_demo_ai import *
+from foodwaste_demo_syntheticdata import get_order_results, CRITICAL_RATIO
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def backtest_heuristic(data, start, k=4):
+    """
+    Heuristic forecasts for all days from start on, vectorized:
+    average sales of the last k same weekdays before each day.
+    """
+    sales = data["sales"].astype(float)
+    weekdays = pd.to_datetime(data["date"]).dt.weekday
+    forecasts = sales.groupby(weekdays).transform(lambda weekday_sales: weekday_sales.rolling(k, min_periods=1).mean().shift(1))
+    return forecasts.to_numpy()[start:]
+
+def backtest_heuristic_samples(data, start, k=8):
+    """
+    Empirical demand distributions of the heuristic for all days from start on, vectorized:
+    sales of the last k same weekdays before each day, as np.ndarray of shape (days, k), NaN where there are fewer.
+    """
+    sales = data["sales"].to_numpy(dtype=float)
+    weekdays = pd.to_datetime(data["date"]).dt.weekday.to_numpy()
+    samples = np.full((len(sales), k), np.nan)
+    for weekday in range(7):
+        rows = np.flatnonzero(weekdays == weekday)
+        padded = np.concatenate([np.full(k, np.nan), sales[rows]])
+        samples[rows] = np.lib.stride_tricks.sliding_window_view(padded, k)[:len(rows)]
+    return samples[start:]
+
+def backtest_last_week(data, start):
+    """
+    Fixed-rule forecasts for all days from start on: sales of the same day last week.
+    """
+    sales = data["sales"].to_numpy(dtype=float)
+    return np.concatenate([np.full(min(7, len(sales)), np.nan), sales[:-7]])[start:]
+
+def backtest_knn(X, y, start, window=None, k=4, n_samples=None):
+    """
+    KNN forecasts for all days from start on. The neighbor index grows incrementally by one day
+    per step (expanding window) or covers the last window days (sliding window).
+    With n_samples, returns the sales of the n_samples nearest days instead (demand distributions,
+    of shape (days, n_samples)).
+    """
+    forecasts = np.empty((len(X) - start, n_samples)) if n_samples else np.empty(len(X) - start)
+    knn_model = IncrementalKNN(n_neighbors=k).fit(X[:start], y[:start])
+    for day in range(start, len(X)):
+        if window is not None:
+            knn_model.fit(X[day - window:day], y[day - window:day])
+        if n_samples:
+            forecasts[day - start] = knn_model.targets(knn_model.kneighbors(X[day:day + 1], return_distance=False, n_neighbors=n_samples))[0]
+        else:
+            forecasts[day - start] = knn_model.predict(X[day:day + 1])[0]
+        if window is None:
+            knn_model.partial_fit(X[day:day + 1], y[day:day + 1])
+    return forecasts
+
+def backtest_xgb(X, y, start, window=None, n_estimators=100, refit_every=28, full_refit_every=364, update_rounds=3, recent_days=365, quantile=None):
+    """
+    XGBoost forecasts for all days from start on, in blocks of refit_every days that are predicted
+    with a single call each. Before each block, the model continues boosting for update_rounds on
+    the most recent days; every full_refit_every days, it is refitted on all (expanding) or the last
+    window (sliding) days. With quantile, forecasts that quantile of sales instead of the mean.
+    """
+    params = get_xgb_params(None if quantile is None else (quantile,))
+    forecasts = np.empty(len(X) - start)
+    xgb_model, last_full_refit = None, None
+    for block_start in range(start, len(X), refit_every):
+        if xgb_model is None or block_start - last_full_refit >= full_refit_every:
+            train_start = 0 if window is None else block_start - window
+            xgb_model = get_xgb().XGBRegressor(n_estimators=n_estimators, **params)
+            xgb_model.fit(X[train_start:block_start], y[train_start:block_start])
+            last_full_refit = block_start
+        else:
+            recent_start = max(block_start - recent_days, 0)
+            booster = xgb_model.get_booster()
+            xgb_model = get_xgb().XGBRegressor(n_estimators=update_rounds, **params)
+            xgb_model.fit(X[recent_start:block_start], y[recent_start:block_start], xgb_model=booster)
+        block_end = min(block_start + refit_every, len(X))
+        forecasts[block_start - start:block_end - start] = xgb_model.predict(X[block_start:block_end])
+    return forecasts
+
+def backtest_orders(data, models=("heuristic", "knn", "xgb"), start=365, window=None, refit_every=28, parallel=True, orders="forecast"):
+    """
+    Walk-forward forecasts and orders of each model for all days from start on, each using only the
+    days before it (see backtest for the arguments).
+
+    Returns:
+        Forecasts and orders per model type (dicts of np.ndarray), without the economic effects.
+    """
+    if window is not None:
+        start = max(start, window)
+
+    # Features of all days (each from the days before it only), ready-made for HistoryStores
+    X, y = get_training_data(data) if {"knn", "xgb"} & set(models) else (None, None)
+    data = as_frame(data)
+
+    backtests = {
+        "heuristic": lambda: backtest_heuristic(data, start),
+        "last_week": lambda: backtest_last_week(data, start),
+        "knn": lambda: backtest_knn(X[:, get_feature_columns(KNN_FEATURES)], y, start, window),
+        "xgb": lambda: backtest_xgb(X[:, get_feature_columns(XGB_FEATURES)], y, start, window, refit_every=refit_every),
+    }
+    order_backtests = {
+        "heuristic": lambda: get_optimal_orders(backtest_heuristic_samples(data, start)),
+        "knn": lambda: get_optimal_orders(backtest_knn(X[:, get_feature_columns(KNN_FEATURES)], y, start, window, n_samples=12)),
+        "xgb": lambda: backtest_xgb(X[:, get_feature_columns(XGB_FEATURES)], y, start, window, refit_every=refit_every, quantile=CRITICAL_RATIO),
+    }
+    jobs = {(model_type, "forecast"): backtests[model_type] for model_type in models}
+    if orders == "newsvendor":
+        jobs.update({(model_type, "order"): order_backtests[model_type] for model_type in models if model_type in order_backtests})
+    if parallel and len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = {job_key: executor.submit(job) for job_key, job in jobs.items()}
+            results = {job_key: future.result() for job_key, future in futures.items()}
+    else:
+        results = {job_key: job() for job_key, job in jobs.items()}
+
+    # Orders: the forecast (or the optimal order of the forecast distribution), rounded down, at least 0
+    forecasts = {model_type: np.nan_to_num(results[(model_type, "forecast")]) for model_type in models}
+    model_orders = {
+        model_type: np.maximum(np.nan_to_num(results.get((model_type, "order"), forecasts[model_type])), 0).astype(int)
+        for model_type in models
+    }
+    return forecasts, model_orders
+
+def backtest(data, models=("heuristic", "knn", "xgb"), start=365, window=None, refit_every=28, parallel=True, orders="forecast"):
+    """
+    Walk-forward backtest: replays history day by day and lets each model forecast every day from
+    start on, using only the days before it. By default, the forecast (rounded down, at least 0) is
+    used as order; with orders="newsvendor", the profit-maximizing order of the model's demand
+    distribution (see get_optimal_orders) is used instead ('last_week' has no distribution).
+
+    Args:
+        data (pd.DataFrame or HistoryStore): Historical sales data.
+        models (tuple): Model types to backtest ('heuristic', 'knn', 'xgb', or the fixed rule 'last_week').
+        start (int): Index of the first day to forecast, the days before are the initial training data.
+        window (int): None for an expanding window, else the number of days of a sliding window.
+        refit_every (int): Days between XGBoost updates (full refits happen yearly).
+        parallel (bool): Backtest the models in parallel threads.
+        orders (str): 'forecast' or 'newsvendor', see above.
+
+    Returns:
+        Daily results (pd.DataFrame with model, date, sales, forecast, order, leftover, missed, budget_delta)
+        and a summary per model (pd.DataFrame with mae, leftover, missed, profit, waste_rate).
+    """
+    if window is not None:
+        start = max(start, window)
+    forecasts, model_orders = backtest_orders(data, models, start, window, refit_every, parallel, orders)
+    data = as_frame(data)
+
+    # Economic effects of the orders
+    sales = data["sales"].to_numpy()[start:]
+    results = []
+    for model_type in models:
+        leftover, missed, budget_delta = get_order_results(model_orders[model_type], sales)
+        results.append(pd.DataFrame({
+            "model": model_type,
+            "date": data["date"].to_numpy()[start:],
+            "sales": sales,
+            "forecast": forecasts[model_type],
+            "order": model_orders[model_type],
+            "leftover": leftover,
+            "missed": missed,
+            "budget_delta": budget_delta,
+        }))
+    results = pd.concat(results, ignore_index=True)
+    return results, summarize_backtest(results)
+
+def summarize_backtest(results):
+    """
+    Returns MAE, total leftover (waste), total missed sales, profit and waste rate per model.
+    """
+    results = results.assign(abs_error=(results["forecast"] - results["sales"]).abs())
+    summary = results.groupby("model", sort=False).agg(
+        mae=("abs_error", "mean"),
+        leftover=("leftover", "sum"),
+        missed=("missed", "sum"),
+        profit=("budget_delta", "sum"),
+        ordered=("order", "sum"),
+    )
+    summary["waste_rate"] = summary["leftover"] / summary["ordered"].where(summary["ordered"] > 0)
+    return summary.drop(columns="ordered")
@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import fnmatch
+import importlib.metadata
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from foodwaste_demo_strings import *
+from foodwaste_demo_syntheticdata import *
+from foodwaste_demo_history import HistoryStore
+from foodwaste_demo_ai import *
+
+# All benchmarks work on histories starting here (and the demo's fixed seed), so runs are comparable
+START_DATE = datetime(2020, 1, 1)
+
+# Relative slowdown of the median (against the baseline) from which a benchmark counts as regressed
+DEFAULT_TOLERANCE = 0.25
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def measure(run, repeat=5, number=1, setup=None):
+    """Times run() repeat times (number calls each, after calling setup() if given, untimed).
+    :return: dict with the median, minimum and maximum seconds per call, and repeat and number.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(times), "min": min(times), "max": max(times), "repeat": repeat, "number": number}
+
+def per_call(measurement, calls):
+    """Returns a measurement of a run making many calls as seconds per call."""
+    return {**measurement, **{key: measurement[key] / calls for key in ("median", "min", "max")}}
+
+def get_history(years):
+    """Returns the synthetic history of the given number of years from START_DATE, as DataFrame."""
+    return generate_synthetic_data(START_DATE, START_DATE + timedelta(days=years * 365))
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+# Benchmarks: functions of repeat, returning {benchmark name: measurement}
+
+def bench_generation(repeat):
+    """generate_synthetic_data over 1, 3, 10 and 20 years."""
+    return {
+        f"generate_synthetic_data/{years}y": measure(lambda: get_history(years), repeat)
+        for years in (1, 3, 10, 20)
+    }
+
+def bench_holidays(repeat):
+    """get_holiday per date, and get_holidays over a year and over 20 years of dates."""
+    dates = pd.date_range(START_DATE, periods=365)
+    long_dates = pd.date_range(START_DATE, periods=20 * 365)
+    get_holidays(long_dates)  # the calendar is built once per process, not measured here
+    return {
+        "get_holiday/365_calls": measure(lambda: [get_holiday(date) for date in dates], repeat),
+        "get_holidays/1y": measure(lambda: get_holidays(dates), repeat, number=10),
+        "get_holidays/20y": measure(lambda: get_holidays(long_dates), repeat, number=10),
+    }
+
+def bench_localization(repeat):
+    """get_localized_string per call, over all keys of both languages."""
+    calls = [(key, lang) for key in TRANSLATIONS for lang in ("Deutsch", "English")]
+    lookups = measure(lambda: [get_localized_string(key, lang) for key, lang in calls], repeat, number=100)
+    return {"get_localized_string/call": per_call(lookups, len(calls))}
+
+def bench_models(repeat, years=3, horizon=14):
+    """Training (from scratch, bypassing the model registry) and single and batch (horizon days)
+    prediction latency of each model type, on years of history."""
+    data = get_history(years)
+    history = HistoryStore.from_frame(data)
+    tomorrow = generate_tomorrow(data)
+    days = generate_next_days(data, horizon)
+    results = {
+        "train/knn": measure(lambda: train_knn_model(history), repeat),
+        "train/xgb": measure(lambda: train_xgb_model(history), repeat),
+    }
+    for model_type in ("heuristic", "knn", "xgb"):
+        warm_model(history, model_type)  # predictions use the trained model of the registry
+        results[f"predict/{model_type}/single"] = measure(lambda: predict_tomorrow_sales_by_type(history, tomorrow, model_type, "English"), repeat)
+        results[f"predict/{model_type}/batch{horizon}"] = measure(lambda: predict_sales_by_type(history, days, model_type), repeat)
+    return results
+
+def bench_end_day(repeat, years=3, n_days=50):
+    """Cost of ending a day: appending it to a fork of the history, and updating the models incrementally."""
+    data = get_history(years)
+    base = HistoryStore.from_frame(data)
+    rows = generate_next_days(data, n_days).assign(order=0, leftover=0, missed=0).to_dict(orient="records")
+    state = {}
+
+    def fork():
+        state["history"] = base.fork()
+
+    def append_all():
+        for row in rows:
+            state["history"].append(row)
+
+    def append_and_update():
+        history = state["history"]
+        history.append(rows[len(history) - len(base)])
+        get_knn_model(history)
+        get_xgb_model(history)
+
+    def fork_warm():
+        fork()
+        warm_model(state["history"], "knn")
+        warm_model(state["history"], "xgb")
+
+    return {
+        "end_day/append": per_call(measure(append_all, repeat, setup=fork), n_days),
+        "end_day/append_and_update_models": measure(append_and_update, repeat, setup=fork_warm),
+    }
+
+def bench_app(repeat, timeout=120):
+    """The first run and reruns of the Streamlit script, headless via streamlit's AppTest.
+    The app saves to a fresh temporary directory, so the first run starts cold and the real saves are never touched."""
+    from streamlit.testing.v1 import AppTest
+    import foodwaste_demo_persistence
+
+    script = str(Path(__file__).with_name("foodwaste_demo.py"))
+    data_dir = foodwaste_demo_persistence.DATA_DIR
+    with tempfile.TemporaryDirectory(prefix="foodwaste_demo_benchmark-") as directory:
+        foodwaste_demo_persistence.DATA_DIR = Path(directory)
+        try:
+            app = AppTest.from_file(script, default_timeout=timeout)
+            start = time.perf_counter()
+            app.run()
+            first_run = time.perf_counter() - start
+            if app.exception:
+                raise RuntimeError(f"The app failed: {app.exception[0].value}")
+            return {
+                "app/first_run": {"median": first_run, "min": first_run, "max": first_run, "repeat": 1, "number": 1},
+                "app/rerun": measure(app.run, repeat),
+            }
+        finally:
+            foodwaste_demo_persistence.DATA_DIR = data_dir
+
+BENCHMARKS = {
+    "generation": bench_generation,
+    "holidays": bench_holidays,
+    "localization": bench_localization,
+    "models": bench_models,
+    "end_day": bench_end_day,
+    "app": bench_app,
+}
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def get_environment():
+    """Returns what results depend on besides the code: Python, library versions and machine."""
+    versions = {}
+    for package in ("numpy", "pandas", "holidays", "xgboost", "streamlit", "plotly"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(), "packages": versions}
+
+def run_benchmarks(groups=tuple(BENCHMARKS), repeat=5, only=None):
+    """Runs benchmark groups (see BENCHMARKS).
+    :param only: Glob pattern of benchmark names to keep, e.g. 'predict/*'.
+    :return: dict with the environment, the time of the run and the measurements per benchmark name (in seconds per call).
+    """
+    results = {}
+    for group in groups:
+        measurements = BENCHMARKS[group](repeat)
+        results.update({name: measurement for name, measurement in measurements.items() if only is None or fnmatch.fnmatch(name, only)})
+    return {"created": datetime.now().isoformat(timespec="seconds"), "environment": get_environment(), "results": results}
+
+def compare_benchmarks(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compares the medians of results with those of a baseline (both as returned by run_benchmarks).
+    :return: pd.DataFrame with baseline and current median, their ratio and whether it regressed (by more than tolerance), per benchmark of both.
+    """
+    names = [name for name in results["results"] if name in baseline["results"]]
+    comparison = pd.DataFrame({
+        "baseline": [baseline["results"][name]["median"] for name in names],
+        "current": [results["results"][name]["median"] for name in names],
+    }, index=pd.Index(names, name="benchmark"))
+    comparison["ratio"] = comparison["current"] / comparison["baseline"]
+    comparison["regressed"] = comparison["ratio"] > 1 + tolerance
+    return comparison
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of data generation, prediction and the app, stored as JSON and compared to a baseline.")
+    parser.add_argument("--groups", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--only", default=None, help="glob pattern of benchmark names to keep, e.g. 'predict/*'")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per benchmark, their median counts")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to store results in")
+    parser.add_argument("--baseline", default=None, help="JSON file of earlier results to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative slowdown that counts as regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.groups, args.repeat, args.only)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(pd.DataFrame(results["results"]).T[["median", "min", "max"]])
+        if args.baseline:
+            comparison = compare_benchmarks(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+            print(comparison)
+            if comparison["regressed"].any():
+                print("Regressed: " + ", ".join(comparison.index[comparison["regressed"]]), file=sys.stderr)
+                sys.exit(1)
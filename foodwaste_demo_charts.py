@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from foodwaste_demo_strings import *
+from foodwaste_demo_syntheticdata import CAKE_COST
+from foodwaste_demo_ai import ModelRegistry, estimate_size, get_model_key
+from foodwaste_demo_startup import import_backend
+from foodwaste_demo_metrics import add_gauge, span
+
+# Days at the end of the history that are drawn at daily resolution. Older days are drawn as weekly
+# averages from the history's rollups, or monthly ones beyond MAX_OVERVIEW_POINTS weeks, so drawing
+# costs O(periods), not O(days), and does not slow down as the history grows.
+DETAIL_DAYS = 365
+MAX_OVERVIEW_POINTS = 260
+
+# Days shown when a chart opens (its range slider covers all history)
+INITIAL_RANGE_DAYS = 14
+
+# Minor gridlines every week, starting on a Monday, separate the weeks
+WEEK_GRID = dict(tick0=datetime(2000, 1, 3), dtick=7 * 24 * 60 * 60 * 1000, showgrid=True, gridcolor="lightgrey", griddash="dot")
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def downsample(history, columns, detail_days=DETAIL_DAYS, max_points=MAX_OVERVIEW_POINTS):
+    """
+    Returns date and the given columns (see ROLLUP_COLUMNS) of a HistoryStore for drawing: the last
+    detail_days as they are, and the periods before them as averages per day, from its weekly
+    rollup (or its monthly one, if there are more than max_points weeks). The days drawn as they are
+    start with a period, so no day is in both.
+    """
+    overview = history.rollup("week")
+    if len(overview) > max_points:
+        overview = history.rollup("month")
+    first_detail_date = history.tail(detail_days)["date"].iloc[0]
+    boundary = overview["date"][overview["date"] <= first_detail_date].iloc[-1]  # start of the period of that day
+    detail = history.tail(detail_days + (first_detail_date - boundary).days)[["date", *columns]]
+    overview = overview[overview["date"] < boundary]
+    overview = overview[columns].div(overview["days"], axis=0).assign(date=overview["date"])
+    return pd.concat([overview[["date", *columns]], detail], ignore_index=True)
+
+def get_date_axis(history, language):
+    """Returns the layout of a date axis showing the most recent days, with week gridlines and range slider."""
+    last_date = history.last()["date"]
+    return dict(
+        title=get_localized_string("dateAxis", language),
+        type="date",
+        range=[last_date - timedelta(days=INITIAL_RANGE_DAYS), last_date],
+        rangeslider=dict(visible=True),
+        minor=WEEK_GRID,
+    )
+
+def get_plotly():
+    """Returns plotly.graph_objects, imported on first use only, as importing it takes long (see foodwaste_demo_startup.py)."""
+    return import_backend("plotly.graph_objects")
+
+def build_sales_chart(history, language):
+    """Builds the chart of sales and orders of a HistoryStore."""
+    points = downsample(history, ["sales", "order"])
+    go = get_plotly()
+    fig = go.Figure([
+        go.Scatter(x=points["date"], y=points[column], mode="lines", name=get_localized_string(axis, language))
+        for column, axis in (("sales", "salesAxis"), ("order", "orderAxis"))
+    ])
+    fig.update_layout(
+        title=get_localized_string("salesHistory", language),
+        xaxis=get_date_axis(history, language),
+        yaxis=dict(fixedrange=True),
+    )
+    return fig
+
+def build_weather_chart(history, language):
+    """Builds the chart of temperature and weather (icons, for the days at daily resolution) of a HistoryStore."""
+    points = downsample(history, ["temperature"])
+    recent = history.tail(DETAIL_DAYS)
+    go = get_plotly()
+    fig = go.Figure([
+        go.Scatter(x=points["date"], y=points["temperature"], mode="lines", name=get_localized_string("temperatureAxis", language)),
+        go.Scatter(
+            x=recent["date"],
+            y=np.full(len(recent), points["temperature"].min()), # all at the lowest temperature
+            text=recent["weather"],
+            mode="text",
+            textposition="top center",
+            textfont=dict(size=16), # icon size
+            name=get_localized_string("weatherAxis", language),
+        ),
+    ])
+    fig.update_layout(
+        title=get_localized_string("weatherHistory", language),
+        xaxis=get_date_axis(history, language),
+        yaxis=dict(title=get_localized_string("temperatureAxis", language), fixedrange=True),
+    )
+    return fig
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Key figures, from the rollups only
+
+def get_kpis(history, weeks=4):
+    """
+    Returns key figures of the last weeks (by default the last 4 complete weeks of the weekly rollup,
+    leaving out the current week until it is complete) and of the same number of weeks before, as
+    dicts with profit, leftover (waste), missed and waste_rate (leftover per ordered cake).
+    """
+    rollup = history.rollup("week")
+    if len(rollup) and rollup["days"].iloc[-1] < 7:
+        rollup = rollup.iloc[:-1]
+
+    def figures(periods):
+        ordered = periods["order"].sum()
+        return {
+            "profit": int(periods["budget_delta"].sum()),
+            "leftover": int(periods["leftover"].sum()),
+            "missed": int(periods["missed"].sum()),
+            "waste_rate": periods["leftover"].sum() / ordered if ordered > 0 else 0.0,
+        }
+    return figures(rollup.iloc[-weeks:]), figures(rollup.iloc[-2 * weeks:-weeks])
+
+def build_profit_chart(history, language, months=24):
+    """Builds the chart of profit and leftover (waste) per month of the last months of a HistoryStore."""
+    periods = history.rollup("month").tail(months)
+    go = get_plotly()
+    fig = go.Figure([
+        go.Bar(x=periods["date"], y=periods["budget_delta"], name=get_localized_string("kpiProfit", language)),
+        go.Bar(x=periods["date"], y=periods["leftover"] * CAKE_COST, name=get_localized_string("kpiWasteCost", language)),
+    ])
+    fig.update_layout(
+        title=get_localized_string("profitPerMonth", language),
+        xaxis=dict(title=get_localized_string("monthAxis", language), type="date", dtick="M1" if len(periods) <= 12 else "M3"),
+        yaxis=dict(title="€", fixedrange=True),
+        barmode="group",
+    )
+    return fig
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Charts by name, built on demand
+CHARTS = {"sales": build_sales_chart, "weather": build_weather_chart, "profit": build_profit_chart}
+
+def get_chart_size(figure):
+    """Returns the approximate size of a chart in bytes, from the data of its traces."""
+    return sum(estimate_size(np.asarray(trace[name])) for trace in figure.data for name in ("x", "y", "text") if trace[name] is not None)
+
+# Built charts of all sessions, keyed like models by dataset id, data version and language
+chart_registry = ModelRegistry(max_entries=32, max_bytes=64 * 1024 * 1024, name="charts", sizeof=get_chart_size)
+add_gauge(chart_registry.name, chart_registry.stats)
+
+def get_chart(history, name, language):
+    """Returns the chart (plotly Figure) of the given name for the current version of a HistoryStore,
+    built once per version and language. The returned figure is shared and must not be modified."""
+    key = get_model_key(history, name + "_chart", language=language)
+    def build():
+        with span("chart/" + name):
+            return CHARTS[name](history, language)
+    return chart_registry.get_or_train(key, build)
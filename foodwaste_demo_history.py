@@ -0,0 +1,732 @@
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from foodwaste_demo_syntheticdata import HISTORY_DTYPES, WEATHER_CONDITIONS, get_day_types, get_order_results
+
+# Columns of the sales history and their storage types, categorical columns are stored as
+# codes into the shared vocabularies below (see HISTORY_DTYPES for the column types as read)
+HISTORY_COLUMNS = {
+    "date": "datetime64[ns]",
+    "dayofweek": np.int8,
+    "order": np.int32,
+    "sales": np.int32,
+    "leftover": np.int32,
+    "missed": np.int32,
+    "weather": np.int8,
+    "temperature": np.int8,
+    "daytype": np.int16,
+    "unexpected": np.int8,
+}
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+class Vocabulary:
+    """
+    Append-only mapping between category values and integer codes, shared by all history stores,
+    so codes stay valid across stores, sessions and versions. Thread-safe.
+    """
+
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        self._dtype = None
+        self._lock = threading.Lock()
+        self.encode_unique(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode_unique(self, values):
+        """Returns the codes of distinct values, adding unknown values to the vocabulary."""
+        codes = [self._codes.get(value) for value in values]
+        if None in codes:
+            with self._lock:
+                for i, value in enumerate(values):
+                    if value not in self._codes:
+                        self._codes[value] = len(self.values)
+                        self.values.append(value)
+                    codes[i] = self._codes[value]
+        return np.array(codes, dtype=np.int64)
+
+    def encode(self, values):
+        """Returns the codes of many values (categoricals are encoded via their categories only)."""
+        if isinstance(values, pd.Series):
+            values = values.array
+        if not isinstance(values, pd.Categorical):
+            values = pd.Categorical(values)
+        return self.encode_unique(list(values.categories))[values.codes]
+
+    @property
+    def dtype(self):
+        """pd.CategoricalDtype of the current vocabulary."""
+        dtype = self._dtype
+        if dtype is None or len(dtype.categories) != len(self.values):
+            dtype = self._dtype = pd.CategoricalDtype(list(self.values))
+        return dtype
+
+    def decode(self, codes):
+        """Returns codes as pd.Categorical, without copying them."""
+        return pd.Categorical.from_codes(codes, dtype=self.dtype, validate=False)
+
+# Vocabularies of the categorical history columns, pre-registered so codes do not depend on
+# the order days are seen in; weekday and weather codes equal their indices in WEEKDAYS and
+# WEATHER_CONDITIONS, code 0 of unexpected events is no event, code 0 of day types is normal
+VOCABULARIES = {
+    "dayofweek": Vocabulary(HISTORY_DTYPES["dayofweek"].categories),
+    "weather": Vocabulary(HISTORY_DTYPES["weather"].categories),
+    "daytype": Vocabulary(get_day_types()),
+    "unexpected": Vocabulary(HISTORY_DTYPES["unexpected"].categories),
+}
+
+def encode_column(name, values):
+    """Returns history column values in their storage type."""
+    if name in VOCABULARIES:
+        return VOCABULARIES[name].encode(values).astype(HISTORY_COLUMNS[name])
+    return np.asarray(values).astype(HISTORY_COLUMNS[name])
+
+def decode_column(name, stored):
+    """Returns stored history column values as read: pd.Categorical for categorical columns, else as is."""
+    return VOCABULARIES[name].decode(stored) if name in VOCABULARIES else stored
+
+# Model input features: features of the day itself, computed from its stored columns by featurize,
+# and lag/rolling-window features of the days before it, computed by lag_features
+DAY_FEATURES = ["dayofweek_num", "dayofweek_sin", "weather_num", "temperature", "daytype_num"]
+LAG_FEATURES = [
+    "sales_lag1", "sales_lag7", "sales_lag14",  # sales 1, 7 and 14 days before
+    "sales_mean7", "sales_std7",  # over the last 7 days
+    "sales_weekday_mean4",  # over the last 4 same weekdays
+    "rain_days7", "temperature_mean7",  # over the last 7 days, as used by get_sales
+]
+FEATURES = DAY_FEATURES + LAG_FEATURES
+FEATURE_COLUMNS = ["dayofweek", "weather", "temperature", "daytype"]
+LAG_WINDOW = 14  # days before a day that lag_features needs (besides the weekday index)
+WEEKDAY_WINDOW = 4 * 7  # days before a day that lag_features needs without weekday index
+RAIN_CODE = 1  # weather code of rain, see WEATHER_CONDITIONS
+
+def featurize(dayofweek, weather, temperature, daytype):
+    """
+    Shared featurizer for training and inference rows: returns the DAY_FEATURES matrix of days,
+    given their stored FEATURE_COLUMNS (weekday, weather and daytype codes, temperatures).
+    """
+    dayofweek = np.asarray(dayofweek, dtype=float)
+    return np.column_stack([dayofweek, np.sin(2 * np.pi * dayofweek / 7), weather, temperature, daytype]).astype(float)
+
+def as_days(days):
+    """Returns days given as DataFrame, list of dicts or a single dict (e.g. tomorrow) as DataFrame."""
+    if isinstance(days, pd.DataFrame):
+        return days
+    return pd.DataFrame([days] if isinstance(days, dict) else list(days))
+
+def check_next_days(last_date, days):
+    """Raises a ValueError unless the dates of days are consecutive, starting the day after last_date (if any)."""
+    dates = pd.DatetimeIndex(days["date"]).normalize()
+    first_date = pd.Timestamp(last_date) + pd.Timedelta(days=1) if last_date is not None else dates[0]
+    if not (dates == pd.date_range(first_date, periods=len(dates))).all():
+        raise ValueError(f"Expected consecutive days from {first_date.date()} on, got {len(dates)} days from {dates[0].date()} on")
+
+def featurize_days(days):
+    """Returns the DAY_FEATURES matrix of days given as DataFrame with at least date, weather, temperature
+    and daytype (the weekday is taken from date). Unseen categories are added to the vocabularies,
+    so this works for any day."""
+    weekdays = pd.DatetimeIndex(days["date"]).weekday.to_numpy()
+    return featurize(weekdays, *(encode_column(name, days[name]) for name in FEATURE_COLUMNS[1:]))
+
+def lag_features(sales, weather, temperature, dayofweek, start, weekday_index=None):
+    """
+    Returns the LAG_FEATURES matrix of the days from position start on, each computed only from
+    the days before it. The days before start are context (LAG_WINDOW days suffice), so the work
+    per day is constant, no matter how long the history is.
+    Same-weekday averages continue weekday_index, which must not contain the days from start on yet;
+    without weekday_index, they only use the context (4 weeks suffice).
+    Sales can be given per series, with shape (days, series): features then have shape (days, series, features).
+    Features of days without enough history before them are NaN.
+    """
+    sales = np.asarray(sales, dtype=float)
+    dayofweek = np.asarray(dayofweek)
+    new_weekdays = dayofweek[start:]
+    positions = np.arange(start, len(sales))
+    features = np.full((len(positions),) + sales.shape[1:] + (len(LAG_FEATURES),), np.nan)
+    def per_day(values):
+        """Reshapes values per day for broadcasting against per-series values."""
+        return np.reshape(values, (len(values),) + (1,) * (sales.ndim - 1))
+
+    # Lagged sales
+    for column, lag in enumerate((1, 7, 14)):
+        valid = positions >= lag
+        features[valid, ..., column] = sales[positions[valid] - lag]
+
+    # Rolling 7-day windows, from running sums
+    window_starts = np.maximum(positions - 7, 0)
+    counts = per_day(positions - window_starts)
+    def rolling_sum(values):
+        cumsum = np.concatenate([np.zeros((1,) + np.shape(values)[1:]), np.cumsum(values, axis=0, dtype=float)])
+        return cumsum[positions] - cumsum[window_starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = rolling_sum(sales) / counts
+        features[..., 3] = mean
+        features[..., 4] = np.sqrt(np.maximum(rolling_sum(sales ** 2) / counts - mean ** 2, 0))
+        features[..., 6] = np.where(counts > 0, per_day(rolling_sum(np.asarray(weather) == RAIN_CODE)), np.nan)
+        features[..., 7] = per_day(rolling_sum(temperature)) / counts
+
+        # Same weekday averages: latest days of the index (or context), then the new days of that weekday
+        for weekday in np.unique(new_weekdays):
+            is_weekday = new_weekdays == weekday
+            if weekday_index is not None:
+                previous, _ = weekday_index.latest(weekday, 4)
+            else:
+                previous = sales[:start][dayofweek[:start] == weekday][-4:]
+            combined = np.concatenate([previous, sales[start:][is_weekday]])
+            cumsum = np.concatenate([np.zeros((1,) + sales.shape[1:]), np.cumsum(combined, axis=0)])
+            weekday_positions = len(previous) + np.arange(np.count_nonzero(is_weekday))
+            weekday_starts = np.maximum(weekday_positions - 4, 0)
+            features[is_weekday, ..., 5] = (cumsum[weekday_positions] - cumsum[weekday_starts]) / per_day(weekday_positions - weekday_starts)
+    return features
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+class WeekdayIndex:
+    """
+    Ring buffers of the latest sales (and their row positions) per weekday (0 = Monday),
+    maintained incrementally as days are appended. Answers "average of the last k same
+    weekdays" in O(k), for many weekdays at once.
+    With a shape, e.g. (series,) for a panel, every day holds sales of that shape.
+    """
+
+    def __init__(self, capacity=52, shape=()):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.sales = np.zeros((7, capacity) + self.shape)
+        self.rows = np.full((7, capacity), -1, dtype=np.int64)
+        self.counts = np.zeros(7, dtype=np.int64)  # days added per weekday, the next slot is counts % capacity
+
+    def copy(self):
+        index = WeekdayIndex(self.capacity, self.shape)
+        index.sales, index.rows, index.counts = self.sales.copy(), self.rows.copy(), self.counts.copy()
+        return index
+
+    def add(self, weekday, sales, row):
+        """Adds a single day."""
+        slot = self.counts[weekday] % self.capacity
+        self.sales[weekday, slot] = sales
+        self.rows[weekday, slot] = row
+        self.counts[weekday] += 1
+
+    def add_many(self, weekdays, sales, rows):
+        """Adds many days (in chronological order), only the latest capacity per weekday are kept."""
+        for weekday in range(7):
+            mask = weekdays == weekday
+            weekday_sales, weekday_rows = sales[mask][-self.capacity:], rows[mask][-self.capacity:]
+            slots = (self.counts[weekday] + np.count_nonzero(mask) - len(weekday_sales) + np.arange(len(weekday_sales))) % self.capacity
+            self.sales[weekday, slots] = weekday_sales
+            self.rows[weekday, slots] = weekday_rows
+            self.counts[weekday] += np.count_nonzero(mask)
+
+    def _latest_slots(self, weekdays, k):
+        """Returns ring buffer slots of the latest k days per weekday (newest first) and their validity."""
+        k = min(k, self.capacity)
+        weekdays = np.asarray(weekdays)
+        age = np.arange(k)
+        slots = (self.counts[weekdays][..., None] - 1 - age) % self.capacity
+        valid = age < np.minimum(self.counts[weekdays], self.capacity)[..., None]
+        return slots, valid
+
+    def latest(self, weekday, k=4):
+        """Returns sales and row positions of the last k days of a weekday, oldest first."""
+        slots, valid = self._latest_slots(weekday, k)
+        slots = slots[valid][::-1]
+        return self.sales[weekday, slots], self.rows[weekday, slots]
+
+    def latest_sales(self, weekdays, k=4):
+        """Returns sales of the last k days of each given weekday, newest first, of shape (weekdays, k, *shape).
+        Weekdays with fewer days get NaN for the missing ones."""
+        slots, valid = self._latest_slots(weekdays, k)
+        sales = self.sales[np.asarray(weekdays)[:, None], slots]
+        return np.where(valid.reshape(valid.shape + (1,) * len(self.shape)), sales, np.nan)
+
+    def predict(self, weekdays, k=4, decay=None):
+        """
+        Returns the (weighted) average sales of the last k same weekdays for each given weekday.
+        With decay, the i-th latest day is weighted by decay**i, else all k days weigh the same.
+        Weekdays without any days yet get NaN. Returns shape (weekdays, *shape).
+        """
+        if self.shape:
+            slots, valid = self._latest_slots(weekdays, k)
+            latest_sales = self.sales[np.asarray(weekdays)[:, None], slots]
+            weights = np.where(valid, 1.0 if decay is None else decay ** np.arange(slots.shape[1]), 0.0)
+            weights = weights.reshape(weights.shape + (1,) * len(self.shape))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return (latest_sales * weights).sum(axis=1) / weights.sum(axis=1)
+        return predict_weekday_averages(self.sales[None], self.counts[None], np.asarray(weekdays)[None], k, decay)[0]
+
+def predict_weekday_averages(sales, counts, weekdays, k=4, decay=None):
+    """
+    Batch heuristic over many WeekdayIndexes (e.g. stores) at once.
+    :param sales: Stacked WeekdayIndex.sales, shape (stores, 7, capacity).
+    :param counts: Stacked WeekdayIndex.counts, shape (stores, 7).
+    :param weekdays: Weekdays to predict per store, shape (stores, dates).
+    :return: np.ndarray of shape (stores, dates)
+    """
+    capacity = sales.shape[2]
+    k = min(k, capacity)
+    age = np.arange(k)
+    store_counts = np.take_along_axis(counts, weekdays, axis=1)[..., None]
+    slots = (store_counts - 1 - age) % capacity
+    valid = age < np.minimum(store_counts, capacity)
+    store_indices = np.arange(len(sales))[:, None, None]
+    latest_sales = sales[store_indices, weekdays[..., None], slots]
+    weights = np.where(valid, 1.0 if decay is None else decay ** age, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (latest_sales * weights).sum(axis=-1) / weights.sum(axis=-1)
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Values summed per period by Rollups: the number of days, order results, budget_delta (see get_order_results),
+# temperature (divide by days for the average) and the number of days of each of the WEATHER_CONDITIONS
+ROLLUP_COLUMNS = ["days", "sales", "order", "leftover", "missed", "budget_delta", "temperature", *WEATHER_CONDITIONS]
+ROLLUP_PERIODS = ("week", "month")
+
+class Rollup:
+    """
+    Sums of the ROLLUP_COLUMNS per calendar period (weeks starting on Monday, or months), maintained
+    incrementally as days are appended in chronological order, so aggregate views (e.g. profit per
+    month, or a zoomed-out chart) cost O(periods) instead of O(days).
+    """
+
+    def __init__(self, period="week", capacity=64):
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown period '{period}', expected one of {ROLLUP_PERIODS}")
+        self.period = period
+        self.first = None  # number of the first period (see period_numbers)
+        self.size = 0
+        self.sums = np.zeros((max(capacity, 1), len(ROLLUP_COLUMNS)))
+
+    def copy(self):
+        rollup = Rollup(self.period, len(self.sums))
+        rollup.first, rollup.size, rollup.sums = self.first, self.size, self.sums.copy()
+        return rollup
+
+    def __len__(self):
+        return self.size
+
+    def period_numbers(self, dates):
+        """Returns the consecutive numbers of the periods of dates (datetime64), counted from 1970."""
+        if self.period == "month":
+            return np.asarray(dates).astype("datetime64[M]").astype(np.int64)
+        return (np.asarray(dates).astype("datetime64[D]").astype(np.int64) + 3) // 7  # 1970-01-01 is a Thursday
+
+    def period_starts(self, numbers):
+        """Returns the first days of the given period numbers, as datetime64[ns]."""
+        if self.period == "month":
+            return np.asarray(numbers).astype("datetime64[M]").astype("datetime64[ns]")
+        return (np.asarray(numbers) * 7 - 3).astype("datetime64[D]").astype("datetime64[ns]")
+
+    def add_many(self, dates, values):
+        """Adds days (in chronological order), given their dates and values of shape (days, ROLLUP_COLUMNS)."""
+        if len(dates) == 0:
+            return
+        numbers = self.period_numbers(dates)
+        if self.first is None:
+            self.first = numbers[0]
+        positions = numbers - self.first
+        size = max(self.size, positions[-1] + 1)
+        if size > len(self.sums):
+            grown = np.zeros((max(size, 2 * len(self.sums)), len(ROLLUP_COLUMNS)))
+            grown[:self.size] = self.sums[:self.size]
+            self.sums = grown
+        starts = np.flatnonzero(np.diff(positions, prepend=-1))  # first day of each period
+        self.sums[positions[starts]] += np.add.reduceat(np.asarray(values, dtype=float), starts, axis=0)
+        self.size = size
+
+    def to_frame(self):
+        """Returns one row per period, with its first day as date and the sums of the ROLLUP_COLUMNS."""
+        frame = pd.DataFrame(self.sums[:self.size], columns=ROLLUP_COLUMNS).astype(np.int64)
+        frame.insert(0, "date", self.period_starts(self.first + np.arange(self.size)) if self.size else np.array([], dtype="datetime64[ns]"))
+        return frame
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+class HistoryStore:
+    """Append-optimized, columnar sales history.
+
+    Every column is a preallocated NumPy array that doubles its capacity when full,
+    so appending a day is amortized O(1). A DataFrame view is built on demand and
+    cached until the next append. Columns are stored compactly (HISTORY_COLUMNS) and
+    read with the types of HISTORY_DTYPES. The model feature matrix (FEATURES) is
+    maintained alongside, featurizing only the appended days (with constant work per day),
+    as are weekly and monthly Rollups and the number of days with an unexpected event.
+
+    A store can be forked from a shared base store: the fork only holds the days
+    appended to it, the base is never modified (and must not be appended to anymore).
+    """
+
+    def __init__(self, capacity=64, base=None):
+        self.id = uuid.uuid4().hex  # identity of this dataset, e.g. for model caches
+        self.version = 0  # incremented on every append
+        self._base = base
+        self._base_size = len(base) if base is not None else 0
+        self._size = 0
+        self._columns = {name: np.empty(max(capacity, 1), dtype=dtype) for name, dtype in HISTORY_COLUMNS.items()}
+        self._features = np.empty((max(capacity, 1), len(FEATURES)))
+        self._cache = {}  # materialized columns/frame of the current version
+        self.event_count = base.event_count if base is not None else 0  # days with an unexpected event
+        self.weekday_index = base.weekday_index.copy() if base is not None else WeekdayIndex()
+        self.rollups = {period: base.rollups[period].copy() if base is not None else Rollup(period) for period in ROLLUP_PERIODS}
+
+    @classmethod
+    def from_frame(cls, frame, capacity=None):
+        """Creates a store holding all rows of a history DataFrame."""
+        store = cls(capacity=capacity or len(frame))
+        store.extend(frame)
+        return store
+
+    @classmethod
+    def from_stored(cls, columns, features, weekday_index, rollups, id=None, version=0):
+        """Creates a store directly on stored column arrays (in the storage types of HISTORY_COLUMNS) and
+        their FEATURES matrix, weekday index and rollups, without copying them, e.g. memory-mapped
+        arrays of a saved store (see foodwaste_demo_persistence.py). Appending copies them first."""
+        store = cls.__new__(cls)
+        store.id = id or uuid.uuid4().hex
+        store.version = version
+        store._base, store._base_size = None, 0
+        store._size = len(columns["date"])
+        store._columns = {name: columns[name] for name in HISTORY_COLUMNS}
+        store._features = features
+        store._cache = {}
+        store.event_count = int(np.count_nonzero(store._columns["unexpected"]))
+        store.weekday_index = weekday_index
+        store.rollups = rollups
+        return store
+
+    def fork(self):
+        """Creates an empty store on top of this one, sharing (not copying) its rows."""
+        return HistoryStore(base=self)
+
+    @property
+    def data_key(self):
+        """(id, version) identifying the current content, e.g. for model caches.
+        A fork without own days yet has the content, and so the key, of its base."""
+        if self._size == 0 and self._base is not None:
+            return self._base.data_key
+        return self.id, self.version
+
+    @property
+    def base_key(self):
+        """data_key of the base this store was forked from, or None."""
+        return self._base.data_key if self._base is not None else None
+
+    @property
+    def nbytes(self):
+        """Bytes allocated by this store itself (columns, features, weekday index and rollups), not by its base
+        or cached views; memory-mapped columns count although they are shared via the page cache."""
+        arrays = [*self._columns.values(), self._features, self.weekday_index.sales, self.weekday_index.rows]
+        return sum(array.nbytes for array in arrays) + sum(rollup.sums.nbytes for rollup in self.rollups.values())
+
+    def snapshot(self):
+        """Returns a read-only view of the current version, e.g. for use in other threads.
+        Later appends to this store are not visible in the snapshot (rows are never overwritten)."""
+        snapshot = HistoryStore.__new__(HistoryStore)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot._columns = dict(self._columns)
+        snapshot._cache = dict(self._cache)
+        snapshot.weekday_index = self.weekday_index.copy()
+        snapshot.rollups = {period: rollup.copy() for period, rollup in self.rollups.items()}
+        return snapshot
+
+    def __len__(self):
+        return self._base_size + self._size
+
+    # ---- writing
+
+    def _reserve(self, size):
+        """Makes sure there is room for size rows, doubling the capacity as needed."""
+        capacity = len(self._columns["date"])
+        if size <= capacity and self._columns["date"].flags.writeable:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        features = np.empty((capacity, len(FEATURES)))
+        features[:self._size] = self._features[:self._size]
+        self._features = features
+
+    def _featurize(self, start, stop):
+        """Computes the features of own rows start to stop from their stored columns (and the
+        LAG_WINDOW days before them). Must be called before the rows are added to the weekday index."""
+        self._features[start:stop, :len(DAY_FEATURES)] = featurize(*(self._columns[name][start:stop] for name in FEATURE_COLUMNS))
+        window_start = max(self._base_size + start - LAG_WINDOW, 0)
+        window = {name: self._stored_range(name, window_start, self._base_size + stop) for name in ("sales", "weather", "temperature", "dayofweek")}
+        self._features[start:stop, len(DAY_FEATURES):] = lag_features(**window, start=self._base_size + start - window_start, weekday_index=self.weekday_index)
+
+    def _roll_up(self, start, stop):
+        """Adds own rows start to stop to the rollups."""
+        order, sales, leftover, missed = (self._columns[name][start:stop] for name in ("order", "sales", "leftover", "missed"))
+        weather = self._columns["weather"][start:stop]
+        values = np.column_stack([
+            np.ones(stop - start), sales, order, leftover, missed, get_order_results(order.astype(np.int64), sales)[2],
+            self._columns["temperature"][start:stop], *(weather == code for code in range(len(WEATHER_CONDITIONS))),
+        ])
+        for rollup in self.rollups.values():
+            rollup.add_many(self._columns["date"][start:stop], values)
+
+    def append(self, row):
+        """Appends a single day, given as dict with (at least) all history columns."""
+        self._reserve(self._size + 1)
+        for name, column in self._columns.items():
+            value = row[name]
+            if name == "date":
+                value = np.datetime64(value, "ns")
+            elif name in VOCABULARIES:
+                value = VOCABULARIES[name].encode_unique([value])[0]
+            column[self._size] = value
+        self._featurize(self._size, self._size + 1)
+        self._roll_up(self._size, self._size + 1)
+        self.weekday_index.add(pd.Timestamp(row["date"]).weekday(), row["sales"], len(self))
+        self.event_count += bool(self._columns["unexpected"][self._size])
+        self._size += 1
+        self.version += 1
+        self._cache = {}
+
+    def extend(self, frame):
+        """Appends all rows of a history DataFrame at once."""
+        count = len(frame)
+        self._reserve(self._size + count)
+        for name, column in self._columns.items():
+            column[self._size:self._size + count] = encode_column(name, frame[name])
+        self._featurize(self._size, self._size + count)
+        self._roll_up(self._size, self._size + count)
+        weekdays = pd.DatetimeIndex(frame["date"]).weekday.to_numpy()
+        self.weekday_index.add_many(weekdays, np.asarray(frame["sales"], dtype=float), len(self) + np.arange(count))
+        self.event_count += int(np.count_nonzero(self._columns["unexpected"][self._size:self._size + count]))
+        self._size += count
+        self.version += 1
+        self._cache = {}
+
+    # ---- reading
+
+    def _stored_range(self, name, start, stop):
+        """Returns the stored values of a column for the rows start to stop (positions in the whole history)."""
+        if self._base is None or start >= self._base_size:
+            return self._columns[name][start - self._base_size:stop - self._base_size]
+        base_part = self._base._stored_range(name, start, min(stop, self._base_size))
+        return np.concatenate([base_part, self._columns[name][:max(stop - self._base_size, 0)]])
+
+    def next_features(self, days):
+        """
+        Returns the FEATURES matrix of the next days after the history, e.g. tomorrow or the next
+        week, given as dict or (list of) days with at least date, weather, temperature and daytype.
+        The days must be consecutive, starting the day after the last day of the history. Their sales
+        are unknown: for the lag features of later days, they are estimated by same-weekday averages.
+        """
+        days = as_days(days)
+        check_next_days(self._stored_range("date", len(self) - 1, len(self))[0] if len(self) else None, days)
+        weekdays = pd.DatetimeIndex(days["date"]).weekday.to_numpy()
+        window_start = max(len(self) - LAG_WINDOW, 0)
+        next_days = {
+            "sales": np.nan_to_num(self.weekday_index.predict(weekdays)),
+            "weather": encode_column("weather", days["weather"]),
+            "temperature": encode_column("temperature", days["temperature"]),
+            "dayofweek": weekdays,
+        }
+        window = {name: np.concatenate([self._stored_range(name, window_start, len(self)), values]) for name, values in next_days.items()}
+        lags = lag_features(**window, start=len(self) - window_start, weekday_index=self.weekday_index)
+        return np.hstack([featurize_days(days), lags])
+
+    def codes(self, name):
+        """Returns a full column in its storage type (codes for categorical columns) as np.ndarray
+        (a view where possible, do not modify)."""
+        own = self._columns[name][:self._size]
+        if self._base is None:
+            return own
+        if name not in self._cache:
+            self._cache[name] = np.concatenate([self._base.codes(name)[:self._base_size], own])
+        return self._cache[name]
+
+    def column(self, name):
+        """Returns a full column as read: pd.Categorical for categorical columns, else np.ndarray (do not modify)."""
+        return decode_column(name, self.codes(name))
+
+    def features(self):
+        """Returns the FEATURES matrix of all days as np.ndarray (a view where possible, do not modify)."""
+        own = self._features[:self._size]
+        if self._base is None:
+            return own
+        if "features" not in self._cache:
+            self._cache["features"] = np.concatenate([self._base.features()[:self._base_size], own])
+        return self._cache["features"]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def tail(self, n):
+        """Returns the last n days as DataFrame, without materializing the whole history."""
+        n = min(n, len(self))
+        if n <= self._size or self._base is None:
+            columns = {name: decode_column(name, column[self._size - n:self._size]) for name, column in self._columns.items()}
+            return pd.DataFrame(columns, index=pd.RangeIndex(len(self) - n, len(self)), copy=False)
+        return pd.concat([self._base.tail(n - self._size), self.tail(self._size)])
+
+    def rows(self, positions):
+        """Returns the days at the given (ascending) row positions as DataFrame."""
+        positions = np.asarray(positions, dtype=np.int64)
+        own = positions[positions >= self._base_size] - self._base_size
+        columns = {name: decode_column(name, column[own]) for name, column in self._columns.items()}
+        own_rows = pd.DataFrame(columns, index=own + self._base_size)
+        if self._base is None:
+            return own_rows
+        return pd.concat([self._base.rows(positions[positions < self._base_size]), own_rows])
+
+    def last(self):
+        """Returns the latest day as dict."""
+        return self.tail(1).to_dict(orient="records")[0]
+
+    def rollup(self, period="week"):
+        """Returns the sums of the ROLLUP_COLUMNS per week or month as DataFrame, see Rollup.to_frame
+        (cached until the next append, do not modify)."""
+        if "rollup_" + period not in self._cache:
+            self._cache["rollup_" + period] = self.rollups[period].to_frame()
+        return self._cache["rollup_" + period]
+
+    def to_frame(self):
+        """Returns the whole history as DataFrame (cached until the next append, do not modify)."""
+        if "frame" not in self._cache:
+            columns = {name: self.column(name) for name in HISTORY_COLUMNS}
+            self._cache["frame"] = pd.DataFrame(columns, copy=False)
+        return self._cache["frame"]
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# History columns shared by all series of a panel (one value per day) and per series (one value per day and series)
+DAY_COLUMNS = ["date", "dayofweek", "weather", "temperature", "daytype"]
+SERIES_COLUMNS = ["order", "sales", "leftover", "missed", "unexpected"]
+
+class PanelHistory:
+    """Append-optimized, columnar sales history of a panel of series (e.g. stores and products).
+
+    All series share their days: DAY_COLUMNS are stored once, SERIES_COLUMNS as (days, series)
+    arrays, in the storage types of HISTORY_COLUMNS and with capacity doubling as in HistoryStore.
+    A WeekdayIndex over all series is maintained alongside, so heuristic forecasts of the whole
+    panel are a single vectorized operation.
+    """
+
+    def __init__(self, series, capacity=64):
+        self.id = uuid.uuid4().hex  # identity of this dataset, e.g. for model caches
+        self.version = 0  # incremented on every append
+        self.series = series.reset_index(drop=True)  # one row per series, e.g. store, product, avg_sales
+        self._size = 0
+        capacity = max(capacity, 1)
+        self._days = {name: np.empty(capacity, dtype=HISTORY_COLUMNS[name]) for name in DAY_COLUMNS}
+        self._values = {name: np.empty((capacity, len(self.series)), dtype=HISTORY_COLUMNS[name]) for name in SERIES_COLUMNS}
+        self.weekday_index = WeekdayIndex(shape=(len(self.series),))
+
+    @classmethod
+    def from_arrays(cls, series, days, values):
+        """Creates a panel from days (pd.DataFrame of DAY_COLUMNS) and values (dict of SERIES_COLUMNS,
+        each of shape (days, series)), as returned by generate_panel_data."""
+        panel = cls(series, capacity=len(days))
+        panel.extend(days, values)
+        return panel
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def n_series(self):
+        return len(self.series)
+
+    # ---- writing
+
+    def _reserve(self, size):
+        """Makes sure there is room for size days, doubling the capacity as needed."""
+        capacity = len(self._days["date"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for columns in (self._days, self._values):
+            for name, column in columns.items():
+                grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                columns[name] = grown
+
+    def append(self, day, values):
+        """Appends a single day: day as dict with DAY_COLUMNS, values as dict of SERIES_COLUMNS
+        with one value per series (unexpected as codes or keys)."""
+        self.extend(as_days(day), {name: np.asarray(column)[None] for name, column in values.items()})
+
+    def extend(self, days, values):
+        """Appends many days: days as pd.DataFrame with DAY_COLUMNS, values as dict of SERIES_COLUMNS,
+        each of shape (days, series)."""
+        count = len(days)
+        self._reserve(self._size + count)
+        for name, column in self._days.items():
+            column[self._size:self._size + count] = encode_column(name, days[name])
+        for name, column in self._values.items():
+            value = np.asarray(values[name])
+            if name in VOCABULARIES and value.dtype.kind not in "iu":
+                value = encode_column(name, value.ravel()).reshape(value.shape)
+            column[self._size:self._size + count] = value
+        weekdays = pd.DatetimeIndex(days["date"]).weekday.to_numpy()
+        self.weekday_index.add_many(weekdays, np.asarray(values["sales"], dtype=float), self._size + np.arange(count))
+        self._size += count
+        self.version += 1
+
+    # ---- reading
+
+    def codes(self, name):
+        """Returns a column in its storage type: of shape (days,) for DAY_COLUMNS, (days, series)
+        for SERIES_COLUMNS (a view, do not modify)."""
+        columns = self._days if name in self._days else self._values
+        return columns[name][:self._size]
+
+    def day_features(self, start=0):
+        """Returns the DAY_FEATURES matrix of the days from start on, shared by all series."""
+        return featurize(*(self.codes(name)[start:] for name in FEATURE_COLUMNS))
+
+    def lag_features(self, start=0):
+        """Returns the LAG_FEATURES of all series for the days from start on, of shape (days, series, features)."""
+        window_start = max(start - WEEKDAY_WINDOW, 0)
+        window = {name: self.codes(name)[window_start:] for name in ("sales", "weather", "temperature", "dayofweek")}
+        return lag_features(**window, start=start - window_start)
+
+    def next_features(self, days):
+        """
+        Returns day features (days, DAY_FEATURES) and lag features (days, series, LAG_FEATURES) of
+        the next days after the panel history, see HistoryStore.next_features.
+        """
+        days = as_days(days)
+        check_next_days(self.codes("date")[-1] if len(self) else None, days)
+        weekdays = pd.DatetimeIndex(days["date"]).weekday.to_numpy()
+        window_start = max(len(self) - WEEKDAY_WINDOW, 0)
+        next_days = {
+            "sales": np.nan_to_num(self.weekday_index.predict(weekdays)),
+            "weather": encode_column("weather", days["weather"]),
+            "temperature": encode_column("temperature", days["temperature"]),
+            "dayofweek": weekdays,
+        }
+        window = {name: np.concatenate([self.codes(name)[window_start:], values]) for name, values in next_days.items()}
+        return featurize_days(days), lag_features(**window, start=len(self) - window_start)
+
+    def series_history(self, series):
+        """Returns the history of a single series (by position) as HistoryStore."""
+        frame = pd.DataFrame({name: decode_column(name, self.codes(name)) for name in DAY_COLUMNS})
+        for name in SERIES_COLUMNS:
+            frame[name] = decode_column(name, self.codes(name)[:, series])
+        return HistoryStore.from_frame(frame[list(HISTORY_COLUMNS)])
+
+    def to_frame(self):
+        """Returns the whole panel in long format as pd.DataFrame: series columns (e.g. store, product),
+        then all history columns, one row per series and day."""
+        n_days, n_series = self._size, self.n_series
+        frame = self.series.drop(columns=["avg_sales", "event_chance"], errors="ignore").iloc[np.tile(np.arange(n_series), n_days)].reset_index(drop=True)
+        for name in HISTORY_COLUMNS:
+            if name in self._days:
+                frame[name] = decode_column(name, np.repeat(self.codes(name), n_series))
+            else:
+                frame[name] = decode_column(name, self.codes(name).ravel())
+        return frame
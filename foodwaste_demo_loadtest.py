@@ -0,0 +1,239 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+import argparse
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# By default, load tests save base histories and models to a temporary directory, so they never touch the real saves
+if "FOODWASTE_DEMO_DATA_DIR" not in os.environ:
+    os.environ["FOODWASTE_DEMO_DATA_DIR"] = tempfile.mkdtemp(prefix="foodwaste_demo_loadtest-")
+
+from foodwaste_demo_strings import get_localized_string
+from foodwaste_demo_syntheticdata import get_order_results
+from foodwaste_demo_benchmark import get_environment
+
+SCRIPT = Path(__file__).with_name("foodwaste_demo.py")
+LANGUAGE = "Deutsch"  # the app's default language, labels are looked up in it
+MODEL_NAMES = {"heuristic": "modelHeu", "knn": "modelKNN", "xgb": "modelXGB"}
+
+# How sessions run (see run_load_test): "interleaved" in threads of this process, sharing its caches and models
+# like the sessions of one worker, but one script run at a time; or "processes", one process per session
+MODES = ("interleaved", "processes")
+
+# AppTest sets (and clears) streamlit's process-global Runtime on every run, so concurrent runs in one
+# process break each other: interleaved sessions take turns running the script (background training continues)
+_app_lock = threading.Lock()
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def get_rss():
+    """Returns the resident memory of this process in bytes (current on Linux, else the peak)."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def find(elements, label):
+    """Returns the element (e.g. button, toggle) of an AppTest with the given localized label."""
+    text = get_localized_string(label, LANGUAGE)
+    for element in elements:
+        if element.label in (text, "<- " + text):
+            return element
+    raise LookupError(f"No element labeled '{text}'")
+
+class Session:
+    """
+    One simulated visitor, driving the app script headless (streamlit's AppTest) and timing each action.
+    Checks that every action does what it should (see check), and collects failures instead of raising.
+    :param lock: Held while the script runs, see _app_lock.
+    """
+
+    def __init__(self, number, timeout=120, lock=None):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.app = AppTest.from_file(str(SCRIPT), default_timeout=timeout)
+        self.lock = lock or nullcontext()
+        self.latencies = []  # (action, seconds), not counting the wait for the lock
+        self.failures = []  # (action, message)
+        self.fallbacks = 0  # predictions answered by the heuristic as the selected model was still training
+
+    def act(self, action, interact=None):
+        """Runs interact() (e.g. clicking a button, which then reruns the script) or a plain rerun, timed as action.
+        :return: the result of interact(), or None if it failed (recorded in failures)."""
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                result = (interact or self.app.run)()
+            except Exception as exception:
+                self.failures.append((action, repr(exception)))
+                return None
+            self.latencies.append((action, time.perf_counter() - start))
+        if self.app.exception:
+            self.failures.append((action, self.app.exception[0].value))
+            return None
+        return result
+
+    def check(self, action, condition, message):
+        if not condition:
+            self.failures.append((action, message))
+
+    def start(self):
+        if self.act("start") is not None:
+            history = self.app.session_state["history"]
+            self.check("start", len(history) > 0 and history.data_key == history.base_key, "a new session does not start on the base history")
+
+    def show_history(self):
+        self.act("show_history", lambda: find(self.app.sidebar.toggle, "showhistory").set_value(True).run())
+        self.check("show_history", len(self.app.get("plotly_chart")) > 0, "no chart shown")
+
+    def predict(self, model_type):
+        state = self.app.session_state
+        self.act("select_model", lambda: find(self.app.selectbox, "modelLabel").set_value(get_localized_string(MODEL_NAMES[model_type], LANGUAGE)).run())
+        if self.act("predict/" + model_type, lambda: find(self.app.button, "aiHelp").click().run()) is None:
+            return
+        explanation = state["prediction_explanation"]
+        self.check("predict/" + model_type, explanation is not None and state["order_prediction"] >= 0, "no prediction")
+        self.fallbacks += bool(explanation and explanation.get("fallback_from"))
+
+    def end_day(self):
+        state = self.app.session_state
+        before = {}
+
+        def click():
+            history = state["history"]
+            before.update(history=history, length=len(history), budget=state["budget"], tomorrow=dict(state["tomorrow_info"]))
+            before["order"] = int(find(self.app.number_input, "ordercommand").value)
+            return find(self.app.button, "endday").click().run()
+
+        if self.act("end_day", click) is None:
+            return
+        history, tomorrow, order = before["history"], before["tomorrow"], before["order"]
+        _, _, budget_delta = get_order_results(order, tomorrow["sales"])
+        self.check("end_day", len(history) == before["length"] + 1 and history.last()["order"] == order, "day not appended to this session's history")
+        self.check("end_day", state["budget"] == before["budget"] + int(budget_delta), "budget does not match the order results")
+        self.check("end_day", state["tomorrow_info"]["date"] == tomorrow["date"] + timedelta(days=1), "tomorrow did not advance by one day")
+
+    def run(self, days=3, models=tuple(MODEL_NAMES), show_history=True):
+        """Plays a visit: start, show the history, and per day request a prediction of each model and end the day."""
+        self.start()
+        if self.failures:
+            return self
+        if show_history:
+            self.show_history()
+        for _ in range(days):
+            for model_type in models:
+                self.predict(model_type)
+            self.end_day()
+        return self
+
+    def summary(self):
+        """Returns the results of the visit (picklable, e.g. to return them from another process)."""
+        history = self.app.session_state["history"] if "history" in self.app.session_state else None
+        return {
+            "number": self.number,
+            "latencies": self.latencies,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "history_id": history.id if history is not None else None,
+            "history_bytes": history.nbytes if history is not None else None,
+            "rss": get_rss(),
+        }
+
+def run_session(number, days, models, show_history, timeout, lock=None):
+    """Plays one visit (see Session.run) and returns its summary."""
+    return Session(number, timeout, lock).run(days, models, show_history).summary()
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def run_load_test(n_sessions=8, concurrency=None, days=3, models=tuple(MODEL_NAMES), show_history=True, timeout=120, mode="interleaved"):
+    """Drives n_sessions simulated sessions through the app script at once, and measures latency per action,
+    memory per session and correctness.
+    In "interleaved" mode, sessions are threads of this process sharing its base history and models, like the
+    sessions of one worker; their script runs take turns (see _app_lock), so latencies show the cost per action
+    on a shared worker, not the waiting for a busy one (that is about duration / actions). In "processes" mode,
+    every session has its own process, so sessions run truly in parallel, without sharing caches (base history
+    and models are shared via disk only), and memory is per process.
+    :param concurrency: Sessions running at the same time, defaults to all of them.
+    :param days: Days each session plays (with one prediction per model and day).
+    :param mode: See MODES.
+    :return: dict with latency percentiles per action (pd.DataFrame), memory, failures and the session summaries.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+    arguments = (days, models, show_history, timeout)
+    rss_before = get_rss()
+    start = time.perf_counter()
+    if mode == "interleaved":
+        with ThreadPoolExecutor(max_workers=concurrency or n_sessions, thread_name_prefix="session") as executor:
+            sessions = list(executor.map(lambda number: run_session(number, *arguments, lock=_app_lock), range(n_sessions)))
+        memory = {"rss_per_session": (get_rss() - rss_before) / n_sessions}
+    else:
+        with ProcessPoolExecutor(max_workers=concurrency or n_sessions, max_tasks_per_child=1) as executor:
+            sessions = [job.result() for job in [executor.submit(run_session, number, *arguments) for number in range(n_sessions)]]
+        memory = {"rss_per_process": float(np.mean([session["rss"] for session in sessions]))}
+    duration = time.perf_counter() - start
+
+    latencies = pd.DataFrame([(action, seconds) for session in sessions for action, seconds in session["latencies"]], columns=["action", "seconds"])
+    percentiles = latencies.groupby("action", sort=False)["seconds"].describe(percentiles=[0.5, 0.9, 0.99])[["count", "50%", "90%", "99%", "max"]]
+    failures = [(session["number"], action, message) for session in sessions for action, message in session["failures"]]
+
+    # Sessions must not share (or lose) their histories
+    history_ids = [session["history_id"] for session in sessions if session["history_id"] is not None]
+    if len(set(history_ids)) != len(history_ids):
+        failures.append((None, "sessions", "sessions share a history"))
+    history_bytes = [session["history_bytes"] for session in sessions if session["history_bytes"] is not None]
+    memory["history_per_session"] = float(np.mean(history_bytes)) if history_bytes else None
+    return {
+        "sessions": sessions,
+        "duration": duration,
+        "latencies": percentiles,
+        "memory": memory,
+        "fallbacks": sum(session["fallbacks"] for session in sessions),
+        "failures": failures,
+    }
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the app with many simulated sessions, offline.")
+    parser.add_argument("--mode", choices=MODES, default="interleaved", help="sessions in threads of one process, taking turns, or in processes")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=None, help="sessions at the same time, defaults to all")
+    parser.add_argument("--days", type=int, default=3, help="days each session plays")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_NAMES), default=list(MODEL_NAMES))
+    parser.add_argument("--no-history", action="store_true", help="do not open the history view")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds an action may take")
+    parser.add_argument("--output", default=None, help="JSON file to store results in")
+    args = parser.parse_args()
+
+    results = run_load_test(args.sessions, args.concurrency, args.days, tuple(args.models), not args.no_history, args.timeout, args.mode)
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(results["latencies"])
+    memory = results["memory"].get("rss_per_session", results["memory"].get("rss_per_process"))
+    print(f"{args.sessions} sessions in {results['duration']:.1f} s, "
+          f"{memory / 2**20:.1f} MiB per {'session' if args.mode == 'interleaved' else 'process'} (RSS), "
+          f"{results['fallbacks']} predictions fell back to the heuristic")
+    for number, action, message in results["failures"]:
+        print(f"FAILED session {number} {action}: {message}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "environment": get_environment(),
+            "settings": vars(args),
+            "duration": results["duration"],
+            "latencies": results["latencies"].to_dict(orient="index"),
+            "memory": results["memory"],
+            "fallbacks": results["fallbacks"],
+            "failures": results["failures"],
+        }, indent=2))
+    raise SystemExit(1 if results["failures"] else 0)
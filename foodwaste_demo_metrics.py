@@ -0,0 +1,111 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+# Logs of all modules of the demo go to children of this logger, e.g. "foodwaste_demo.ai"
+logger = logging.getLogger("foodwaste_demo")
+
+# Whether the app shows its debug panel (timings of the last rerun, counters and caches) in the sidebar
+DEBUG = os.environ.get("FOODWASTE_DEMO_DEBUG", "0") != "0"
+
+# If set, one JSON line per rerun (its spans, and all counters and gauges) is appended to this file
+METRICS_FILE = os.environ.get("FOODWASTE_DEMO_METRICS_FILE")
+
+# Spans slower than this (in seconds) are logged at INFO level, others at DEBUG level
+SLOW_SPAN = 0.5
+
+_lock = threading.Lock()
+_spans = defaultdict(lambda: [0, 0.0, 0.0])  # span name -> [count, total seconds, max seconds], over the whole process
+_counters = defaultdict(int)  # counter name -> count, over the whole process
+_gauges = {}  # gauge name -> function returning a dict of current values, e.g. cache sizes
+_rerun = threading.local()  # spans of the rerun running in this thread (Streamlit runs each session's script in its own thread)
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+@contextmanager
+def span(name):
+    """Times the enclosed code as span name: adds it to the process totals and, if a rerun is being
+    recorded in this thread, to the rerun's spans. Its duration is logged, with span and seconds as record attributes."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with _lock:
+            totals = _spans[name]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+        rerun_spans = getattr(_rerun, "spans", None)
+        if rerun_spans is not None:
+            rerun_spans.append((name, seconds))
+        logger.log(logging.INFO if seconds >= SLOW_SPAN else logging.DEBUG, "span %s took %.3f s", name, seconds,
+                   extra={"span": name, "seconds": seconds})
+
+def timed(name):
+    """Decorator timing every call of a function as span name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, n=1):
+    """Increments a counter, e.g. of cache hits or misses."""
+    with _lock:
+        _counters[name] += n
+
+def add_gauge(name, values):
+    """Registers a function returning a dict of current values (e.g. the size of a cache), read on every snapshot."""
+    _gauges[name] = values
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def start_rerun():
+    """Starts recording the spans of a rerun in this thread (dropping those of an unfinished one)."""
+    _rerun.spans = []
+    _rerun.start = time.perf_counter()
+
+def end_rerun():
+    """Stops recording the rerun of this thread.
+    :return: dict with the rerun's total seconds and its spans as {name: {"count", "seconds"}}, or None if none was started.
+    """
+    rerun_spans = getattr(_rerun, "spans", None)
+    if rerun_spans is None:
+        return None
+    _rerun.spans = None
+    spans = {}
+    for name, seconds in rerun_spans:
+        totals = spans.setdefault(name, {"count": 0, "seconds": 0.0})
+        totals["count"] += 1
+        totals["seconds"] += seconds
+    return {"seconds": time.perf_counter() - _rerun.start, "spans": spans}
+
+def get_snapshot():
+    """Returns the process totals: spans as {name: {"count", "seconds", "max"}}, counters and gauges."""
+    with _lock:
+        spans = {name: {"count": n, "seconds": total, "max": longest} for name, (n, total, longest) in _spans.items()}
+        counters = dict(_counters)
+    gauges = {name: values() for name, values in list(_gauges.items())}
+    return {"spans": spans, "counters": counters, "gauges": gauges}
+
+def export_rerun(rerun, session=None, path=METRICS_FILE):
+    """Appends a rerun (see end_rerun) with the current counters and gauges to the metrics file as one JSON line.
+    No-op without path (see METRICS_FILE)."""
+    if not path or rerun is None:
+        return
+    snapshot = get_snapshot()
+    record = {"time": datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), "session": session,
+              **rerun, "counters": snapshot["counters"], "gauges": snapshot["gauges"]}
+    line = json.dumps(record, default=str) + "\n"
+    with _lock, open(Path(path), "a") as file:
+        file.write(line)
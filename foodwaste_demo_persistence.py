@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from foodwaste_demo_metrics import timed
+from foodwaste_demo_startup import import_backend
+from foodwaste_demo_history import HistoryStore, Rollup, WeekdayIndex, HISTORY_COLUMNS, VOCABULARIES, decode_column
+
+# Saved histories and models, shared by all workers (and restarts) of the demo on a machine
+DATA_DIR = Path(os.environ.get("FOODWASTE_DEMO_DATA_DIR", Path.home() / ".cache" / "foodwaste_demo"))
+
+# Version of the on-disk layout, saves of other versions are ignored (and regenerated)
+FORMAT_VERSION = 1
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def _write_atomically(path, write):
+    """Calls write(temporary path) and moves the result to path, so readers never see partial files
+    or directories. Returns False if path exists already (e.g. written by another worker meanwhile)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = Path(tempfile.mkdtemp(dir=path.parent, prefix=path.name + ".tmp-"))
+    try:
+        write(temporary)
+        os.rename(temporary, path)
+        return True
+    except OSError:
+        if path.exists():
+            return False
+        raise
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+
+def get_history_path(day, subdiv):
+    """Returns the directory the base history of a day and German state is saved to (in DATA_DIR)."""
+    return DATA_DIR / f"history-{day}-{subdiv}"
+
+def prune_histories(day):
+    """Removes the saved histories of all days but day from DATA_DIR, with their models, e.g. after saving the
+    first history of a new day. Workers still using a removed history keep its memory-mapped files until they exit."""
+    for path in DATA_DIR.glob("history-*"):
+        if path.is_dir() and not path.name.startswith(f"history-{day}-"):
+            shutil.rmtree(path, ignore_errors=True)
+
+@timed("save_history")
+def save_history(history, path, extra=None):
+    """Saves a HistoryStore (all its days, including those of its base) to the directory path:
+    one .npy file per column in its storage type (see HISTORY_COLUMNS) and one for the FEATURES matrix,
+    so they can be memory-mapped, plus its weekday index and rollups. meta.json holds its data_key
+    (so models saved for it stay valid) and the vocabularies its codes refer to.
+    :param extra: Anything picklable to save alongside, e.g. the next day.
+    :return: False if a history is saved at path already, else True.
+    """
+    def write(directory):
+        for name in HISTORY_COLUMNS:
+            np.save(directory / f"{name}.npy", history.codes(name))
+        np.save(directory / "features.npy", history.features())
+        weekday_index = history.weekday_index
+        np.savez(
+            directory / "indexes.npz",
+            weekday_sales=weekday_index.sales, weekday_rows=weekday_index.rows, weekday_counts=weekday_index.counts,
+            **{f"rollup_{period}": rollup.sums[:len(rollup)] for period, rollup in history.rollups.items()},
+        )
+        with open(directory / "extra.pkl", "wb") as file:
+            pickle.dump(extra, file)
+        dataset_id, version = history.data_key
+        meta = {
+            "format": FORMAT_VERSION,
+            "id": dataset_id,
+            "version": version,
+            "weekday_capacity": weekday_index.capacity,
+            "rollup_first": {period: None if rollup.first is None else int(rollup.first) for period, rollup in history.rollups.items()},
+            "vocabularies": {name: [str(value) for value in vocabulary.values] for name, vocabulary in VOCABULARIES.items()},
+        }
+        (directory / "meta.json").write_text(json.dumps(meta))
+    return _write_atomically(path, write)
+
+@timed("load_history")
+def load_history(path):
+    """Loads a history saved with save_history, memory-mapping its columns and features (so only the
+    days read are loaded, and all workers share them via the page cache).
+    :return: the HistoryStore (read-only, use forks to append) and the saved extra, or None, None if
+        there is no (compatible) save at path.
+    """
+    path = Path(path)
+    try:
+        meta = json.loads((path / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None, None
+    if meta.get("format") != FORMAT_VERSION:
+        return None, None
+
+    columns = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in HISTORY_COLUMNS}
+    with np.load(path / "indexes.npz") as indexes:
+        weekday_index = WeekdayIndex(meta["weekday_capacity"])
+        weekday_index.sales, weekday_index.rows, weekday_index.counts = indexes["weekday_sales"], indexes["weekday_rows"], indexes["weekday_counts"]
+        rollups = {}
+        for period, first in meta["rollup_first"].items():
+            rollup = rollups[period] = Rollup(period)
+            rollup.sums = indexes[f"rollup_{period}"]
+            rollup.first, rollup.size = first, len(rollup.sums)
+    with open(path / "extra.pkl", "rb") as file:
+        extra = pickle.load(file)
+
+    # Codes refer to the vocabularies at saving time, which only differ if this process has seen other
+    # categories first (e.g. holidays of another state): then the days are re-encoded (and featurized),
+    # as a new dataset, so models saved for the old codes are not reused on the new ones. Its id is derived
+    # from the saved id and the remapping, so its models are reused by restarts (and workers) remapping alike
+    remapping = {}
+    for name, values in meta["vocabularies"].items():
+        saved_values = VOCABULARIES[name].values[:len(values)]
+        if [str(value) for value in saved_values] != values:
+            codes = np.array([VOCABULARIES[name].encode_unique([value])[0] for value in values])
+            columns[name] = codes.astype(HISTORY_COLUMNS[name])[columns[name]]
+            remapping[name] = codes.tolist()
+    if remapping:
+        history = HistoryStore.from_frame(pd.DataFrame({name: decode_column(name, column) for name, column in columns.items()}))
+        history.id = hashlib.sha1(json.dumps([meta["id"], remapping], sort_keys=True).encode()).hexdigest()
+        return history, extra
+
+    features = np.load(path / "features.npy", mmap_mode="r")
+    return HistoryStore.from_stored(columns, features, weekday_index, rollups, meta["id"], meta["version"]), extra
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+class ModelStore:
+    """
+    Trained models on disk, one pickle file per model registry key (dataset id, data version, model type,
+    hyperparameters), e.g. the models of a saved history (in a directory per dataset id, see ModelRegistry.persist). The model dicts are
+    pickled as they are: XGBoost models with their boosters, KNN models with their neighbor index.
+    Only load models from directories no one else can write to.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _path(self, key):
+        return self.directory / (hashlib.sha1(repr(key).encode()).hexdigest() + ".pkl")
+
+    def save(self, key, data):
+        """Saves a pickled model (bytes) for key, replacing older saves atomically."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".tmp-", delete=False) as file:
+            file.write(data)
+        os.replace(file.name, path)
+
+    def load(self, key):
+        """Returns the model saved for key and its size in bytes, or None."""
+        try:
+            data = self._path(key).read_bytes()
+        except OSError:
+            return None
+        if "xgb" in key[2]:
+            import_backend("xgboost")  # unpickling would import it otherwise, racing with other imports of it
+        return pickle.loads(data), len(data)
@@ -0,0 +1,143 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from foodwaste_demo_syntheticdata import *
+from foodwaste_demo_ai import as_frame
+import foodwaste_demo_ai
+from foodwaste_demo_backtest import backtest, backtest_orders
+
+# Scenario settings, scenarios given to run_monte_carlo override these
+DEFAULT_SCENARIO = {
+    "name": "default",
+    "start_date": datetime(2020, 1, 1),
+    "years": 3,
+    "subdiv": HOLIDAY_SUBDIV,
+    "avg_sales": 500,
+    "event_chance": 0.03,
+}
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def simulate_world(scenario, seed):
+    """Generates one synthetic history for a scenario, using its own random stream.
+    :param scenario: Scenario settings, see DEFAULT_SCENARIO.
+    :param seed: Seed (int or np.random.SeedSequence) of the random stream.
+    :return: A pandas DataFrame with synthetic data.
+    """
+    scenario = {**DEFAULT_SCENARIO, **scenario}
+    start_date = scenario["start_date"]
+    end_date = start_date + timedelta(days=scenario["years"] * 365)
+    return generate_synthetic_data(
+        start_date, end_date,
+        subdiv=scenario["subdiv"],
+        rng=np.random.default_rng(seed),
+        avg_sales=scenario["avg_sales"],
+        event_chance=scenario["event_chance"],
+    )
+
+def run_simulation(scenario, seed, policies, start=365):
+    """Simulates one world and backtests all ordering policies on it (runs in a worker process).
+    :return: Summary per policy as pd.DataFrame, with scenario name and seed.
+    """
+    data = simulate_world(scenario, seed)
+    _, summary = backtest(data, models=policies, start=start, parallel=False)
+    summary = summary.reset_index().rename(columns={"model": "policy"})
+    summary.insert(0, "scenario", {**DEFAULT_SCENARIO, **scenario}["name"])
+    summary.insert(1, "seed", seed.spawn_key[-1] if isinstance(seed, np.random.SeedSequence) else seed)
+    return summary
+
+def init_worker():
+    """Runs XGBoost single-threaded in each worker process, as the pool already uses all cores."""
+    foodwaste_demo_ai.XGB_THREADS = 1
+
+def run_monte_carlo(scenarios=(DEFAULT_SCENARIO,), n_seeds=100, policies=("heuristic", "knn", "xgb", "last_week"), root_seed=42, max_workers=None):
+    """Evaluates ordering policies across many independent seeds and scenarios, in a process pool.
+    Every run gets its own np.random.Generator stream, spawned from root_seed (per scenario, so scenarios
+    are independent of each other), so results are reproducible regardless of how runs are distributed over workers.
+    :param scenarios: Scenario settings, see DEFAULT_SCENARIO.
+    :param n_seeds: Number of independent worlds per scenario.
+    :param policies: Ordering policies (model types) to evaluate, see backtest.
+    :param root_seed: Seed all random streams are derived from.
+    :param max_workers: Number of worker processes, defaults to the number of CPUs.
+    :return: results per run (pd.DataFrame) and aggregated distributions per scenario and policy (pd.DataFrame)
+    """
+    scenario_seeds = np.random.SeedSequence(root_seed).spawn(len(scenarios))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as executor:
+        jobs = [executor.submit(run_simulation, scenario, seed, policies) for scenario, scenario_seed in zip(scenarios, scenario_seeds) for seed in scenario_seed.spawn(n_seeds)]
+        results = pd.concat([job.result() for job in jobs], ignore_index=True)
+    return results, aggregate_simulations(results)
+
+def aggregate_simulations(results):
+    """Returns mean, standard deviation and 5%/50%/95% quantiles of profit, leftover (waste),
+    missed sales and MAE per scenario and policy."""
+    quantiles = {
+        "mean": "mean",
+        "std": "std",
+        "q05": lambda values: values.quantile(0.05),
+        "q50": "median",
+        "q95": lambda values: values.quantile(0.95),
+    }
+    return results.groupby(["scenario", "policy"], sort=False)[["profit", "leftover", "missed", "mae"]].agg(list(quantiles.values())).set_axis(
+        pd.MultiIndex.from_product([["profit", "leftover", "missed", "mae"], quantiles.keys()]), axis=1
+    )
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Ordering policies of the fast-forward mode: the model types of foodwaste_demo_ai.py, or the fixed rule
+FAST_FORWARD_POLICIES = ("heuristic", "knn", "xgb", "last_week")
+
+def fast_forward(history, tomorrow, n_days, policy="heuristic", optimize_profit=False, subdiv=HOLIDAY_SUBDIV, rng=None):
+    """Plays n_days in one go, starting with tomorrow, ordering automatically with a policy, and appends
+    them to history in bulk. Demand does not depend on orders, so all days are generated at once and the
+    orders are computed walk-forward as in a backtest (each day's order only uses the days before it).
+    :param history: HistoryStore to append the played days to.
+    :param tomorrow: The next day (dict, see generate_tomorrow), played first.
+    :param n_days: Number of days to play.
+    :param policy: Ordering policy, see FAST_FORWARD_POLICIES.
+    :param optimize_profit: Order the profit-maximizing quantity of the forecast distribution instead of the forecast.
+    :param subdiv: The German state to use holidays of.
+    :param rng: np.random.Generator to draw the days after tomorrow from, see generate_next_days.
+    :return: the played days (pd.DataFrame, with budget_delta per day) and the new tomorrow (dict)
+    """
+    if policy not in FAST_FORWARD_POLICIES:
+        raise ValueError(f"Unknown policy '{policy}', expected one of {FAST_FORWARD_POLICIES}")
+
+    # Generate all days: tomorrow, and the days after it continuing from it
+    tomorrow_row = pd.DataFrame([{**tomorrow, "order": 0, "leftover": 0, "missed": 0}]).astype(HISTORY_DTYPES)
+    recent = pd.concat([history.tail(6), tomorrow_row], ignore_index=True)
+    days = pd.concat([tomorrow_row, generate_next_days(recent, n_days - 1, subdiv, rng)], ignore_index=True).astype(HISTORY_DTYPES)
+
+    # Orders of all days at once, then their effects
+    replay = pd.concat([as_frame(history), days], ignore_index=True)
+    _, orders = backtest_orders(replay, (policy,), start=len(history), parallel=False, orders="newsvendor" if optimize_profit else "forecast")
+    leftover, missed, budget_delta = get_order_results(orders[policy], days["sales"].to_numpy())
+    days["order"], days["leftover"], days["missed"] = orders[policy], leftover, missed
+    days = days.astype(HISTORY_DTYPES)
+
+    history.extend(days)
+    return days.assign(budget_delta=budget_delta), generate_tomorrow(history, subdiv)
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte-Carlo evaluation of ordering policies over synthetic worlds.")
+    parser.add_argument("--seeds", type=int, default=100, help="independent worlds per scenario")
+    parser.add_argument("--years", type=int, default=DEFAULT_SCENARIO["years"], help="years of history per world")
+    parser.add_argument("--policies", nargs="+", default=["heuristic", "knn", "xgb", "last_week"])
+    parser.add_argument("--event-chances", nargs="+", type=float, default=[DEFAULT_SCENARIO["event_chance"]])
+    parser.add_argument("--subdivs", nargs="+", default=[HOLIDAY_SUBDIV], help="German states for holidays")
+    parser.add_argument("--avg-sales", nargs="+", type=int, default=[DEFAULT_SCENARIO["avg_sales"]])
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    scenarios = [
+        {"name": f"{subdiv}/events={event_chance}/sales={avg_sales}", "years": args.years, "subdiv": subdiv, "event_chance": event_chance, "avg_sales": avg_sales}
+        for subdiv in args.subdivs for event_chance in args.event_chances for avg_sales in args.avg_sales
+    ]
+    _, aggregated = run_monte_carlo(scenarios, args.seeds, tuple(args.policies), max_workers=args.workers)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(aggregated)
@@ -0,0 +1,60 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Start of this process's work on the app (this module is imported first by foodwaste_demo.py)
+PROCESS_START = time.perf_counter()
+
+# Slow-to-import backends, only imported on first use (see import_backend) or by preload_backends
+BACKENDS = ("xgboost", "plotly.graph_objects")
+
+# Whether preload_backends imports the backends in the background after the first render;
+# switch off to import them strictly on demand, e.g. in workers that never train XGBoost
+PRELOAD = os.environ.get("FOODWASTE_DEMO_PRELOAD", "1") != "0"
+
+# Seconds each backend took to import (on first use or preloading), and until the first page was rendered
+IMPORT_TIMES = {}
+first_render_time = None
+
+_lock = threading.Lock()
+_import_lock = threading.RLock()  # held while importing a backend, see import_backend
+_preload_thread = None
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def import_backend(name):
+    """Returns the module name, importing it on first use and recording how long that took in IMPORT_TIMES.
+    Backends are imported one at a time, under a single lock: importing the same package from several threads
+    at once (e.g. preloading while training) can otherwise see it partially initialized. Code that imports
+    a backend implicitly, like unpickling a model, must call this first."""
+    if name in IMPORT_TIMES:  # only set once the import has finished
+        return sys.modules[name]
+    with _import_lock:
+        if name not in IMPORT_TIMES:
+            start = time.perf_counter()
+            importlib.import_module(name)
+            IMPORT_TIMES[name] = time.perf_counter() - start
+    return sys.modules[name]
+
+def preload_backends(names=BACKENDS):
+    """Imports the backends in a background thread (once per process, unless PRELOAD is off), so the
+    first prediction or chart does not wait for them. Call after the page was rendered."""
+    global _preload_thread
+    with _lock:
+        if not PRELOAD or _preload_thread is not None:
+            return
+        _preload_thread = threading.Thread(target=lambda: [import_backend(name) for name in names], name="preload", daemon=True)
+        _preload_thread.start()
+
+def record_first_render():
+    """Records the time from PROCESS_START until now as first_render_time, on the first call only."""
+    global first_render_time
+    with _lock:
+        if first_render_time is None:
+            first_render_time = time.perf_counter() - PROCESS_START
+
+def get_startup_report():
+    """Returns seconds until the first render (None before) and the import times of the backends loaded so far."""
+    return {"first_render": first_render_time, "imports": dict(IMPORT_TIMES)}
@@ -1,3 +1,7 @@
+import sys
+
+import numpy as np
+import pandas as pd
 
 # info texts
 info_text_en = """This demonstrator shows how AI can help optimize cake ordering by using past sales patterns and additional data. It demonstrates the challenge we tackled in the Green-AI-Hub project ["KI-basierte Prognosen für Lebensmittelproduktion"](https://www.green-ai-hub.de/pilotprojekte/pilotprojekt-brammibals-donuts-foodtracks): How to reduce food waste while maximizing sales?
@@ -32,81 +36,134 @@ Im Demonstrator steht ein **unerwartetes Ereignis** für eine plötzliche Nachfr
 """
 
 # Translations
+TRANSLATIONS = {
+
+    # streamlit page 
+    "pagetitle": {"Deutsch": "KI-Kuchenbestellung", "English": "AI Cake Ordering"}, 
+    "heading1": {"Deutsch": "🍰 KI gegen Lebensmittelverschwendung", "English": "🍰 Fight Food Waste with AI"},
+    "introtext": {"Deutsch": "Wie kann KI dabei helfen Kuchenbestellung zu optimieren und Verschwendung zu reduzieren?", "English": "How can AI assist optimizing cake ordering and reducing food waste?"},
+    "orderingtitle": {"Deutsch": "Bestellung für morgen", "English": "Order for tomorrow"},
+    "tomorrow": {"Deutsch": "Morgen ist", "English": "Tomorrow is"},
+    "ordercommand": {"Deutsch": "Wie viele Kuchen bestellen?", "English": "How many cakes to order?"},
+    "endday": {"Deutsch": "Tag beenden & Ergebnisse sehen", "English": "End the Day & See Results"},
+    "fastForward": {"Deutsch": "Vorspulen", "English": "Fast-forward"},
+    "fastForwardDays": {"Deutsch": "Anzahl Tage", "English": "Number of days"},
+    "fastForwardButton": {"Deutsch": "Tage automatisch bestellen", "English": "Order days automatically"},
+    "fastForwardInfo": {"Deutsch": "Bestellt jeden Tag automatisch mit dem gewählten Modell.", "English": "Orders every day automatically with the selected model."},
+    "fastForwardSummary": {"Deutsch": "Vorgespult", "English": "Fast-forwarded"},
+    "days": {"Deutsch": "Tage", "English": "days"},
+    "resultsummary": {"Deutsch": "Ergebnisse", "English": "Results"},
+    "options": {"Deutsch": "Optionen", "English": "Options"},
+    "showhistory": {"Deutsch": "Verkaufshistorie anzeigen", "English": "Show Sales History"},
+    "showKpis": {"Deutsch": "Kennzahlen anzeigen", "English": "Show Key Figures"},
+    "kpiTitle": {"Deutsch": "Kennzahlen", "English": "Key Figures"},
+    "kpiPeriod": {"Deutsch": "Letzte 4 vollständige Wochen, Veränderung gegenüber den 4 Wochen davor", "English": "Last 4 complete weeks, change from the 4 weeks before"},
+    "kpiProfit": {"Deutsch": "Gewinn", "English": "Profit"},
+    "kpiWaste": {"Deutsch": "Übrige Kuchen", "English": "Leftover cakes"},
+    "kpiWasteRate": {"Deutsch": "Verschwendungsquote", "English": "Waste rate"},
+    "kpiWasteCost": {"Deutsch": "Kosten übriger Kuchen", "English": "Cost of leftover cakes"},
+    "profitPerMonth": {"Deutsch": "Gewinn pro Monat", "English": "Profit per Month"},
+    "monthAxis": {"Deutsch": "Monat", "English": "Month"},
+    "showinfo": {"Deutsch": "Info & Erklärung", "English": "Show Info & Explanation"},
+    "infotext": {"Deutsch": info_text_de, "English": info_text_en},
+    "feedbackTooMany": {"Deutsch": "Es sind viele Kuchen übrig geblieben. Verschwendung lässt sich reduzieren durch kleinere Bestellungen.", "English": "You ordered too many cakes for today. Consider reducing your order tomorrow."},
+    "feedbackTooFew": {"Deutsch": "Es waren zu wenig Kuchen da. KundInnen mussten ohne Kuchen nach Hause gehen.", "English": "You ordered too few cakes for today. Customers left without a purchase."},
+    "feedbackJustRight": {"Deutsch": "Gut gemacht! Bestellung und Bedarf waren annähernd gleich.", "English": "Great job! Your order matched demand well."},
+    "salesHistory": {"Deutsch": "Verkaufshistorie", "English": "Sales History"},
+    "weatherHistory": {"Deutsch": "Wetter", "English": "weather"},
+    "salesAxis": {"Deutsch": "verkaufte Kuchen", "English": "sold cakes"},
+    "orderAxis": {"Deutsch": "Bestellung", "English": "Order"},
+    "dateAxis": {"Deutsch": "Datum", "English": "Date"},
+    "temperatureAxis": {"Deutsch": "Temperatur °C", "English": "temperature °C"},
+    "weatherAxis": {"Deutsch": "Wetter", "English": "weather"},
+    "aiHelp": {"Deutsch": "KI-Vorhersage", "English": "AI prediction"},
+    "modelLabel": {"Deutsch": "Vorhersagemodell", "English": "prediction model"},
+    "modelHeu": {"Deutsch": "Heuristik", "English": "heuristic"},
+    "modelKNN": {"Deutsch": "KNN", "English": "KNN"},
+    "modelXGB": {"Deutsch": "XGBoost", "English": "XGBoost"},
+    "explainButton": {"Deutsch": "Erklärung anzeigen", "English": "Show explanation"},    
+    "modelStatus": {"Deutsch": "Modellstatus", "English": "Model status"},
+    "modelStatusReady": {"Deutsch": "bereit", "English": "ready"},
+    "modelStatusTraining": {"Deutsch": "wird trainiert", "English": "training"},
+    "modelStatusPending": {"Deutsch": "wartet", "English": "pending"},
+    "modelStatusFailed": {"Deutsch": "Training fehlgeschlagen", "English": "training failed"},
+    "startupFirstRender": {"Deutsch": "Erste Seite nach Start", "English": "First page after startup"},
+    "startupImports": {"Deutsch": "Bei Bedarf geladen", "English": "Loaded on demand"},
+    "debugPanel": {"Deutsch": "Debug: Zeitmessungen", "English": "Debug: timings"},
+    "debugRerun": {"Deutsch": "Dieser Durchlauf", "English": "This rerun"},
+    "debugProcess": {"Deutsch": "Alle Durchläufe dieses Prozesses", "English": "All reruns of this process"},
+    "modelFallback": {"Deutsch": "Das gewählte Modell wird noch trainiert, daher stammt diese Vorhersage von der Heuristik.", "English": "The selected model is still training, so this prediction comes from the heuristic."},
+    "optimizeProfit": {"Deutsch": "Bestellung auf Gewinn optimieren", "English": "Optimize order for profit"},
+    "orderInfoNewsvendor": {"Deutsch": "Die Bestellung ist auf den erwarteten Gewinn optimiert: Ein übrig gebliebener Kuchen kostet 2€, ein verpasster Verkauf nur 1€ entgangenen Gewinn. Daher wird so bestellt, dass die Nachfrage in etwa einem Drittel der Fälle gedeckt ist.", "English": "The order is optimized for expected profit: a leftover cake costs €2, a missed sale only €1 of lost profit. So the order covers demand in about one out of three cases."},
+    "forecastSales": {"Deutsch": "Vorhergesagte Verkäufe", "English": "Forecast sales"},
+    "budgetExplanation": {"Deutsch": "Kuchen kosten bei der Bestellung 2€ und lassen sich für 3€ verkaufen", "English": "Cakes cost €2 and sell for €3"},
+
+    # data fields 
+    "sales": {"Deutsch": "Verkauft", "English": "Sold"},
+    "weather": {"Deutsch": "Wetter", "English": "Weather"},
+    "temperature": {"Deutsch": "Temperatur", "English": "Temperature"},
+    "daytype": {"Deutsch": "Tagestyp", "English": "Day Type"},
+    "resultsold": {"Deutsch": "Nachfrage", "English": "Demand"},
+    "resultleftover": {"Deutsch": "Übrig", "English": "Leftover"},
+    "resultmissed": {"Deutsch": "Verpasste Verkäufe", "English": "Missed sales"},
+    "unexpectedevent": {"Deutsch": "Unerwartetes Ereignis!", "English": "Unexpected event!"},
+    "Monday": {"Deutsch": "Montag", "English": "Monday"},
+    "Tuesday": {"Deutsch": "Dienstag", "English": "Tuesday"},
+    "Wednesday": {"Deutsch": "Mittwoch", "English": "Wednesday"},
+    "Thursday": {"Deutsch": "Donnerstag", "English": "Thursday"},
+    "Friday": {"Deutsch": "Freitag", "English": "Friday"},
+    "Saturday": {"Deutsch": "Samstag", "English": "Saturday"},
+    "Sunday": {"Deutsch": "Sonntag", "English": "Sunday"},
+    "Montag": {"Deutsch": "Montag", "English": "Monday"},
+    "Dienstag": {"Deutsch": "Dienstag", "English": "Tuesday"},
+    "Mittwoch": {"Deutsch": "Mittwoch", "English": "Wednesday"},
+    "Donnerstag": {"Deutsch": "Donnerstag", "English": "Thursday"},
+    "Freitag": {"Deutsch": "Freitag", "English": "Friday"},
+    "Samstag": {"Deutsch": "Samstag", "English": "Saturday"},
+    "Sonntag": {"Deutsch": "Sonntag", "English": "Sunday"},
+    
+    # unexpected events
+    "holidayevent": {"Deutsch": "Feiertag - Laden geschlossen", "English": "Holiday - store closed"},
+    "unexpEventConstruction": {"Deutsch": "Baustelle vorm Eingang", "English": "Construction site in front of store"},
+    "unexpEventDemo": {"Deutsch": "Demonstration für Kuchenfreunde in der Nähe", "English": "Cake Lovers demonstration nearby"},
+    "unexpEventFlea": {"Deutsch": "Flohmarkt in der Straße", "English": "Fleamarket on same street"},
+    "unexpEventOffer": {"Deutsch": "Sonderangebot der Konkurrenz", "English": "Special offer at a competitor's store"},
+    "unexpEventStrike": {"Deutsch": "Streik im öffentlichen Nahverkehr", "English": "Public transportation strike"},
+    "unexpEventSportsGood": {"Deutsch": "Lokalmannschaft gewinnt Spiel", "English": "Local team wins match"},
+    "unexpEventSportsBad": {"Deutsch": "Lokalmannschaft verliert Spiel", "English": "Local team loses match"},
+    "unexpEventBirthday": {"Deutsch": "Großbestellung für Geburtstagsparty", "English": "Special order for a birthday"},
+     
+    # model infos
+    "modelExplanation": {"Deutsch": "Erklärung für KI-Vorhersage", "English": "Explanation for AI prediction"},
+    "noModelExplanationAvailable": {"Deutsch": "Noch keine Modellvorhersage für morgen angefordert", "English": "No model prediction for tomorrow to explain, yet"}, 
+    "modelInfoHeuristic": {"Deutsch": "Beim heuristischen Vorhersageansatz wird das Muster ausgenutzt, dass gleiche Wochentage häufig ähnliche Verkaufszahlen aufweisen. Durch einen Blick auf die Verkäufe der zurückliegenden gleichen Wochentage ist eine Einschätzung der morgigen Verkäufe möglich. Die Heuristik berechnet den Mittelwert aus den letzten 4 selben Wochentagen und sagt diesen voraus. Diese Tage sind:", "English": "The heuristic forecasting approach takes advantage of the pattern that the same weekdays often show similar sales numbers. By looking at sales from past occurrences of the same weekday, it is possible to estimate tomorrow's sales. The heuristic calculates the average of the last four occurrences of the same weekday and uses that as the prediction. These days are:"},
+    "modelInfoKNN": {"Deutsch": "Der k-nächste-Nachbarn-Algorithmus (k-NN) sucht in den historischen Verkaufsdaten nach vergangenen Tagen, die vorherzusagenden Tag am ähnlichsten sind. Dabei werden Faktoren wie Wochentag, Wetter und Feiertage berücksichtigt. Die vorhergesagte Verkaufszahl ist der Durchschnitt der Verkaufszahlen der ähnlichsten vergangenen Tage:", "English": "The k-nearest neighbors (k-NN) algorithm searches historical sales data for past days that are most similar to tomorrow. It takes into account factors such as weekday, weather, and special days. The predicted sales number is the average of the sales figures from the most similar past days:"},
+    "modelInfoXGB": {"Deutsch": "XGBoost ist ein komplexes Machine-Learning-Modell, das Vorhersagen basierend auf Mustern in historischen Daten trifft. Im Gegensatz zu einfacheren Methoden liefert es keine leicht verständlichen Erklärungen für seine Prognosen.", "English": "XGBoost is a complex machine learning model that makes predictions based on patterns in historical data. Unlike simpler methods, it does not provide easily interpretable reasons for its predictions."},
+
+}
+
+def _build_catalogue(translations):
+    """Turns {key: {language: text}} into per-language lookup tables {language: {key: text}}, interning all strings."""
+    catalogue = {}
+    for key, texts in translations.items():
+        for lang, text in texts.items():
+            catalogue.setdefault(lang, {})[sys.intern(key)] = sys.intern(text)
+    return catalogue
+
+# Per-language lookup tables, built once at import
+CATALOGUE = _build_catalogue(TRANSLATIONS)
+
 def get_localized_string(text, lang="Deutsch"):
-    translations = {
-
-        # streamlit page 
-        "pagetitle": {"Deutsch": "KI-Kuchenbestellung", "English": "AI Cake Ordering"}, 
-        "heading1": {"Deutsch": "🍰 KI gegen Lebensmittelverschwendung", "English": "🍰 Fight Food Waste with AI"},
-        "introtext": {"Deutsch": "Wie kann KI dabei helfen Kuchenbestellung zu optimieren und Verschwendung zu reduzieren?", "English": "How can AI assist optimizing cake ordering and reducing food waste?"},
-        "orderingtitle": {"Deutsch": "Bestellung für morgen", "English": "Order for tomorrow"},
-        "tomorrow": {"Deutsch": "Morgen ist", "English": "Tomorrow is"},
-        "ordercommand": {"Deutsch": "Wie viele Kuchen bestellen?", "English": "How many cakes to order?"},
-        "endday": {"Deutsch": "Tag beenden & Ergebnisse sehen", "English": "End the Day & See Results"},
-        "resultsummary": {"Deutsch": "Ergebnisse", "English": "Results"},
-        "options": {"Deutsch": "Optionen", "English": "Options"},
-        "showhistory": {"Deutsch": "Verkaufshistorie anzeigen", "English": "Show Sales History"},
-        "showinfo": {"Deutsch": "Info & Erklärung", "English": "Show Info & Explanation"},
-        "infotext": {"Deutsch": info_text_de, "English": info_text_en},
-        "feedbackTooMany": {"Deutsch": "Es sind viele Kuchen übrig geblieben. Verschwendung lässt sich reduzieren durch kleinere Bestellungen.", "English": "You ordered too many cakes for today. Consider reducing your order tomorrow."},
-        "feedbackTooFew": {"Deutsch": "Es waren zu wenig Kuchen da. KundInnen mussten ohne Kuchen nach Hause gehen.", "English": "You ordered too few cakes for today. Customers left without a purchase."},
-        "feedbackJustRight": {"Deutsch": "Gut gemacht! Bestellung und Bedarf waren annähernd gleich.", "English": "Great job! Your order matched demand well."},
-        "salesHistory": {"Deutsch": "Verkaufshistorie", "English": "Sales History"},
-        "weatherHistory": {"Deutsch": "Wetter", "English": "weather"},
-        "salesAxis": {"Deutsch": "verkaufte Kuchen", "English": "sold cakes"},
-        "orderAxis": {"Deutsch": "Bestellung", "English": "Order"},
-        "dateAxis": {"Deutsch": "Datum", "English": "Date"},
-        "temperatureAxis": {"Deutsch": "Temperatur °C", "English": "temperature °C"},
-        "weatherAxis": {"Deutsch": "Wetter", "English": "weather"},
-        "aiHelp": {"Deutsch": "KI-Vorhersage", "English": "AI prediction"},
-        "modelLabel": {"Deutsch": "Vorhersagemodell", "English": "prediction model"},
-        "modelHeu": {"Deutsch": "Heuristik", "English": "heuristic"},
-        "modelKNN": {"Deutsch": "KNN", "English": "KNN"},
-        "modelXGB": {"Deutsch": "XGBoost", "English": "XGBoost"},
-        "explainButton": {"Deutsch": "Erklärung anzeigen", "English": "Show explanation"},    
-        "budgetExplanation": {"Deutsch": "Kuchen kosten bei der Bestellung 2€ und lassen sich für 3€ verkaufen", "English": "Cakes cost €2 and sell for €3"},
-
-        # data fields 
-        "sales": {"Deutsch": "Verkauft", "English": "Sold"},
-        "weather": {"Deutsch": "Wetter", "English": "Weather"},
-        "temperature": {"Deutsch": "Temperatur", "English": "Temperature"},
-        "daytype": {"Deutsch": "Tagestyp", "English": "Day Type"},
-        "resultsold": {"Deutsch": "Nachfrage", "English": "Demand"},
-        "resultleftover": {"Deutsch": "Übrig", "English": "Leftover"},
-        "resultmissed": {"Deutsch": "Verpasste Verkäufe", "English": "Missed sales"},
-        "unexpectedevent": {"Deutsch": "Unerwartetes Ereignis!", "English": "Unexpected event!"},
-        "Monday": {"Deutsch": "Montag", "English": "Monday"},
-        "Tuesday": {"Deutsch": "Dienstag", "English": "Tuesday"},
-        "Wednesday": {"Deutsch": "Mittwoch", "English": "Wednesday"},
-        "Thursday": {"Deutsch": "Donnerstag", "English": "Thursday"},
-        "Friday": {"Deutsch": "Freitag", "English": "Friday"},
-        "Saturday": {"Deutsch": "Samstag", "English": "Saturday"},
-        "Sunday": {"Deutsch": "Sonntag", "English": "Sunday"},
-        "Montag": {"Deutsch": "Montag", "English": "Monday"},
-        "Dienstag": {"Deutsch": "Dienstag", "English": "Tuesday"},
-        "Mittwoch": {"Deutsch": "Mittwoch", "English": "Wednesday"},
-        "Donnerstag": {"Deutsch": "Donnerstag", "English": "Thursday"},
-        "Freitag": {"Deutsch": "Freitag", "English": "Friday"},
-        "Samstag": {"Deutsch": "Samstag", "English": "Saturday"},
-        "Sonntag": {"Deutsch": "Sonntag", "English": "Sunday"},
-        
-        # unexpected events
-        "holidayevent": {"Deutsch": "Feiertag - Laden geschlossen", "English": "Holiday - store closed"},
-        "unexpEventConstruction": {"Deutsch": "Baustelle vorm Eingang", "English": "Construction site in front of store"},
-        "unexpEventDemo": {"Deutsch": "Demonstration für Kuchenfreunde in der Nähe", "English": "Cake Lovers demonstration nearby"},
-        "unexpEventFlea": {"Deutsch": "Flohmarkt in der Straße", "English": "Fleamarket on same street"},
-        "unexpEventOffer": {"Deutsch": "Sonderangebot der Konkurrenz", "English": "Special offer at a competitor's store"},
-        "unexpEventStrike": {"Deutsch": "Streik im öffentlichen Nahverkehr", "English": "Public transportation strike"},
-        "unexpEventSportsGood": {"Deutsch": "Lokalmannschaft gewinnt Spiel", "English": "Local team wins match"},
-        "unexpEventSportsBad": {"Deutsch": "Lokalmannschaft verliert Spiel", "English": "Local team loses match"},
-        "unexpEventBirthday": {"Deutsch": "Großbestellung für Geburtstagsparty", "English": "Special order for a birthday"},
-         
-        # model infos
-        "modelExplanation": {"Deutsch": "Erklärung für KI-Vorhersage", "English": "Explanation for AI prediction"},
-        "noModelExplanationAvailable": {"Deutsch": "Noch keine Modellvorhersage für morgen angefordert", "English": "No model prediction for tomorrow to explain, yet"}, 
-        "modelInfoHeuristic": {"Deutsch": "Beim heuristischen Vorhersageansatz wird das Muster ausgenutzt, dass gleiche Wochentage häufig ähnliche Verkaufszahlen aufweisen. Durch einen Blick auf die Verkäufe der zurückliegenden gleichen Wochentage ist eine Einschätzung der morgigen Verkäufe möglich. Die Heuristik berechnet den Mittelwert aus den letzten 4 selben Wochentagen und sagt diesen voraus. Diese Tage sind:", "English": "The heuristic forecasting approach takes advantage of the pattern that the same weekdays often show similar sales numbers. By looking at sales from past occurrences of the same weekday, it is possible to estimate tomorrow's sales. The heuristic calculates the average of the last four occurrences of the same weekday and uses that as the prediction. These days are:"},
-        "modelInfoKNN": {"Deutsch": "Der k-nächste-Nachbarn-Algorithmus (k-NN) sucht in den historischen Verkaufsdaten nach vergangenen Tagen, die vorherzusagenden Tag am ähnlichsten sind. Dabei werden Faktoren wie Wochentag, Wetter und Feiertage berücksichtigt. Die vorhergesagte Verkaufszahl ist der Durchschnitt der Verkaufszahlen der ähnlichsten vergangenen Tage:", "English": "The k-nearest neighbors (k-NN) algorithm searches historical sales data for past days that are most similar to tomorrow. It takes into account factors such as weekday, weather, and special days. The predicted sales number is the average of the sales figures from the most similar past days:"},
-        "modelInfoXGB": {"Deutsch": "XGBoost ist ein komplexes Machine-Learning-Modell, das Vorhersagen basierend auf Mustern in historischen Daten trifft. Im Gegensatz zu einfacheren Methoden liefert es keine leicht verständlichen Erklärungen für seine Prognosen.", "English": "XGBoost is a complex machine learning model that makes predictions based on patterns in historical data. Unlike simpler methods, it does not provide easily interpretable reasons for its predictions."},
-
-    }
-    return translations.get(text, {}).get(lang, text)
+    """Returns the translation of a string key (or a known text) into lang, or text itself if unknown."""
+    return CATALOGUE.get(lang, {}).get(text, text)
+
+def localize_column(values, lang="Deutsch"):
+    """Translates a whole column (e.g. weekday names, event keys) at once, each distinct value only once.
+    :param values: pd.Series, np.ndarray or list of string keys.
+    :return: Translated values, as pd.Series (for a pd.Series) or np.ndarray.
+    """
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.rename_categories(lambda category: get_localized_string(category, lang))
+    uniques, inverse = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    translated = np.array([get_localized_string(unique, lang) for unique in uniques], dtype=object)[inverse]
+    return pd.Series(translated, index=values.index, name=values.name) if isinstance(values, pd.Series) else translated
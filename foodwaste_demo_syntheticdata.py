@@ -1,27 +1,150 @@
 
 from datetime import datetime, timedelta
+import threading
 import holidays
 
 import numpy as np
 import pandas as pd
 
 from foodwaste_demo_strings import * 
+from foodwaste_demo_metrics import timed
 
+# Weather conditions as icons: Sunny, Rainy, Snowy, Partly Cloudy
+WEATHER_CONDITIONS = ["☀️", "🌧️", "❄️", "🌤️"]
 
-def get_holiday(date):
+# Unforeseen events as (string key, sales modifier)
+UNEXPECTED_EVENTS = [
+    ("unexpEventConstruction", 0.85),
+    ("unexpEventDemo", 1.2),
+    ("unexpEventFlea", 1.3),
+    ("unexpEventOffer", 0.8),
+    ("unexpEventStrike", 0.7),
+    ("unexpEventSportsGood", 1.15),
+    ("unexpEventSportsBad", 0.75),
+    ("unexpEventBirthday", 1.15),
+]
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Canonical, language-neutral column types of the history: categoricals (weekday codes are 0 = Monday,
+# no event is ""), daytype holds holiday names of an open vocabulary, small ints for counts and temperatures
+HISTORY_DTYPES = {
+    "date": "datetime64[ns]",
+    "dayofweek": pd.CategoricalDtype(WEEKDAYS),
+    "order": np.int32,
+    "sales": np.int32,
+    "leftover": np.int32,
+    "missed": np.int32,
+    "weather": pd.CategoricalDtype(WEATHER_CONDITIONS),
+    "temperature": np.int8,
+    "daytype": "category",
+    "unexpected": pd.CategoricalDtype([""] + [key for key, _ in UNEXPECTED_EVENTS]),
+}
+
+# Economics of the demo
+CAKE_COST = 2  # € per ordered cake
+CAKE_PRICE = 3  # € per sold cake
+
+# Newsvendor critical ratio: one more ordered cake earns CAKE_PRICE - CAKE_COST if sold and loses
+# CAKE_COST if not, so ordering pays off up to the (CAKE_PRICE - CAKE_COST) / CAKE_PRICE quantile of demand
+CRITICAL_RATIO = (CAKE_PRICE - CAKE_COST) / CAKE_PRICE
+
+def get_order_results(order, sales):
+    """Given order(s) and actual sales (demand), returns leftover, missed sales and budget change.
+    Works on single values as well as on np.ndarrays.
+    :return: leftover, missed, budget_delta
+    """
+    leftover = np.maximum(order - sales, 0)
+    missed = np.maximum(sales - order, 0)
+    budget_delta = (order - leftover) * CAKE_PRICE - order * CAKE_COST
+    return leftover, missed, budget_delta
+
+
+# Holiday calendars, defaults to German/Berlin holidays
+HOLIDAY_COUNTRY = "DE"
+HOLIDAY_SUBDIV = "BE"
+GERMAN_STATES = holidays.Germany.subdivisions
+
+_holiday_calendars = {}  # (country, subdiv) -> (first day, day types), shared by all callers
+_holiday_calendars_lock = threading.Lock()
+
+def _build_holiday_calendar(country, subdiv, start_year, end_year):
+    """Precomputes the day types of all days from start_year through end_year.
+    :return: first day as np.datetime64, day types as np.ndarray of strings (dense, one entry per day)
+    """
+    state_holidays = holidays.country_holidays(country=country, subdiv=subdiv, years=range(start_year - 1, end_year + 2))
+
+    # Holiday names for all days, padded by one day on each side for the before/after lookups
+    first_day = np.datetime64(f"{start_year}-01-01", "D")
+    one_day = np.timedelta64(1, "D")
+    days = np.arange(first_day - one_day, np.datetime64(f"{end_year + 1}-01-01", "D") + one_day)
+    names = np.full(len(days), "", dtype=object)
+    for holiday_date, holiday_name in state_holidays.items():
+        offset = (np.datetime64(holiday_date, "D") - days[0]).astype(int)
+        if 0 <= offset < len(days):
+            names[offset] = holiday_name
+
+    # Holidays first, then 'day after', then 'day before', as in the single-date lookup
+    current, previous, following = names[1:-1], names[:-2], names[2:]
+    day_types = np.full(len(current), "normal", dtype=object)
+    is_before = following != ""
+    day_types[is_before] = "day before " + following[is_before]
+    is_after = previous != ""
+    day_types[is_after] = "day after " + previous[is_after]
+    is_holiday = current != ""
+    day_types[is_holiday] = current[is_holiday]
+    return first_day, day_types
+
+def get_day_types(country=HOLIDAY_COUNTRY, subdivs=GERMAN_STATES, start_year=2000, end_year=2040):
+    """Returns all possible day types of the given regions and years, in a stable order:
+    'normal', then all holiday names, then their 'day after' and 'day before' variants (sorted).
+    """
+    names = set()
+    for subdiv in subdivs:
+        names |= set(holidays.country_holidays(country=country, subdiv=subdiv, years=range(start_year, end_year + 1)).values())
+    names = sorted(names)
+    return ["normal"] + names + ["day after " + name for name in names] + ["day before " + name for name in names]
+
+def get_holiday_calendar(start_year, end_year, country=HOLIDAY_COUNTRY, subdiv=HOLIDAY_SUBDIV):
+    """Returns the cached calendar for a region covering at least start_year through end_year.
+    Calendars are built once per region and only rebuilt when a larger year range is requested.
+    :return: first day as np.datetime64, day types as np.ndarray of strings (one entry per day)
+    """
+    if country == "DE" and subdiv not in GERMAN_STATES:
+        raise ValueError(f"Unknown German state '{subdiv}', expected one of {GERMAN_STATES}")
+    with _holiday_calendars_lock:
+        calendar = _holiday_calendars.get((country, subdiv))
+        if calendar is not None:
+            first_day, day_types = calendar
+            first_year = first_day.astype(object).year
+            last_year = (first_day + np.timedelta64(len(day_types) - 1, "D")).astype(object).year
+            if first_year <= start_year and end_year <= last_year:
+                return calendar
+            start_year, end_year = min(start_year, first_year), max(end_year, last_year)
+        calendar = _build_holiday_calendar(country, subdiv, start_year, end_year)
+        _holiday_calendars[(country, subdiv)] = calendar
+        return calendar
+
+def get_holidays(dates, country=HOLIDAY_COUNTRY, subdiv=HOLIDAY_SUBDIV):
+    """Vectorized get_holiday for many dates at once.
+    :param dates: Sequence of dates (list, pd.Series, np.ndarray, ...).
+    :return: np.ndarray of day types: 'normal' or '(day before/after) holiday name'
+    """
+    days = pd.DatetimeIndex(dates).values.astype("datetime64[D]")
+    if len(days) == 0:
+        return np.array([], dtype=object)
+    years = days.astype("datetime64[Y]").astype(int) + 1970
+    first_day, day_types = get_holiday_calendar(int(years.min()), int(years.max()), country, subdiv)
+    return day_types[(days - first_day).astype(int)]
+
+def get_holiday(date, subdiv=HOLIDAY_SUBDIV):
     """Given a date, returns its holiday name, a before/after info or 'normal' for non-holidays.
-    Only checks for German/Berlin holidays for now.
+    Only checks for German holidays, Berlin by default.
     :param date: The date to check for holidays.
+    :param subdiv: The German state to use holidays of.
     :return: type of day: 'normal' or '(day before/after) holiday name'
     """
-    state_holidays = holidays.country_holidays(country="DE", subdiv="BE", years=date.year)
-    date_type = state_holidays.get(date, "normal")
-    if date_type == "normal": # for normal days, check if previous/next day is holiday
-        if state_holidays.get(date - timedelta(days=1)):
-            date_type = "day after " + state_holidays.get(date - timedelta(days=1))
-        elif state_holidays.get(date + timedelta(days=1)):
-            date_type = "day before " + state_holidays.get(date + timedelta(days=1))
-    return date_type
+    return get_holidays([date], subdiv=subdiv)[0]
 
 def get_weather(date, history):
     """Given a date and some history, derives realistic-ish weather conditions for that day.
@@ -31,7 +154,7 @@ def get_weather(date, history):
     """
 
     # Define weather conditions and probabilities
-    weather_conditions = ["☀️", "🌧️", "❄️", "🌤️"]  # Sunny, Rainy, Snowy, Partly Cloudy
+    weather_conditions = WEATHER_CONDITIONS
     month = date.month
     
     # Compute seasonal baseline temperature
@@ -73,7 +196,7 @@ def get_weather(date, history):
     
     return temperature, weather
 
-def get_sales(date, history, temperature, weather, is_holiday, language, force_event=False):
+def get_sales(date, history, temperature, weather, is_holiday, force_event=False, avg_sales=500, event_chance=0.03):
     """Given a date and some history, derives realistic-ish sales for that day.
     :param date: The date for which to get sales.
     :param history: All history before the date, in a pd.DataFrame with at leat columns: date, sales, temperature, weather.
@@ -81,10 +204,11 @@ def get_sales(date, history, temperature, weather, is_holiday, language, force_e
     :param weather: Weather for date.
     :param is_holiday: Type of the day: 'normal' or '(day before/after) holiday name'.
     :param force_event: If True, force an unforeseen event for this day
-    :return: sales as int (amount of cakes)
+    :param avg_sales: Base average sales.
+    :param event_chance: Chance for an unforeseen event.
+    :return: sales as int (amount of cakes), unexpected event as string key (or "")
     """
 
-    avg_sales = 500  # Base average sales
     day_of_week = date.strftime("%A")
     
     # Base sales pattern: 50% higher on weekends
@@ -122,19 +246,9 @@ def get_sales(date, history, temperature, weather, is_holiday, language, force_e
     
     # Random unforeseen event 
     event = ""
-    unforeseen_events = [ 
-        (get_localized_string("unexpEventConstruction", language), 0.85),
-        (get_localized_string("unexpEventDemo", language), 1.2),
-        (get_localized_string("unexpEventFlea", language), 1.3),
-        (get_localized_string("unexpEventOffer", language), 0.8),
-        (get_localized_string("unexpEventStrike", language), 0.7),
-        (get_localized_string("unexpEventSportsGood", language), 1.15),
-        (get_localized_string("unexpEventSportsBad", language), 0.75),
-        (get_localized_string("unexpEventBirthday", language), 1.15),
-    ]
-
-    chance = 0.03 # 3% chance for unexpected events in general 
-    if np.random.rand() < chance or force_event == True: 
+    unforeseen_events = UNEXPECTED_EVENTS # events are stored as string keys, translated for display only
+
+    if np.random.rand() < event_chance or force_event == True: # 3% chance for unexpected events in general by default
         event, event_modifier = unforeseen_events[np.random.randint(len(unforeseen_events))]
         base_sales *= event_modifier
     
@@ -143,14 +257,35 @@ def get_sales(date, history, temperature, weather, is_holiday, language, force_e
     
     return sales, event
 
-def generate_synthetic_data(start_date, end_date, language):
+@timed("generate_synthetic_data")
+def generate_synthetic_data(start_date, end_date, engine="vectorized", subdiv=HOLIDAY_SUBDIV, rng=None, avg_sales=500, event_chance=0.03):
     """Generates a synthetic dataset of cake orders and sales over a given time period.
     :param start_date: The start date of the dataset.
     :param end_date: The end date of the dataset.
-    :return: A pandas DataFrame with synthetic data.
+    :param engine: 'vectorized' (default, linear time) or 'loop' (day-by-day reference implementation).
+    :param subdiv: The German state to use holidays of.
+    :param rng: np.random.Generator to draw from (vectorized engine only). By default, the demo's fixed seed is used.
+    :param avg_sales: Base average sales.
+    :param event_chance: Chance for an unforeseen event per day.
+    :return: A pandas DataFrame with synthetic data, typed as in HISTORY_DTYPES. Weekdays (dayofweek) and unexpected
+        events are stored language-neutral as keys, to be translated for display (see get_localized_string, localize_column).
     """
 
-    np.random.seed(42) # make sure today's demo is the same for everyone
+    if rng is None:
+        np.random.seed(42) # make sure today's demo is the same for everyone
+        rng = np.random.default_rng(42)
+
+    if engine == "loop":
+        return _generate_synthetic_data_loop(start_date, end_date, subdiv, avg_sales, event_chance)
+    elif engine == "vectorized":
+        return _generate_synthetic_data_vectorized(start_date, end_date, rng, subdiv, avg_sales, event_chance)
+    else:
+        raise ValueError(f"Unknown engine '{engine}', expected 'vectorized' or 'loop'")
+
+def _generate_synthetic_data_loop(start_date, end_date, subdiv=HOLIDAY_SUBDIV, avg_sales=500, event_chance=0.03):
+    """Reference implementation: simulates day by day via get_weather/get_sales, using the global RNG.
+    Quadratic in the number of days, kept to compare against the vectorized engine.
+    """
     
     # Prepare to store data
     columns = ["date", "dayofweek", "order", "sales", "leftover", "missed", "weather", "temperature", "daytype", "unexpected"]
@@ -161,14 +296,14 @@ def generate_synthetic_data(start_date, end_date, language):
     while current_date <= end_date:
         
         # Check if/which holiday
-        day_of_week = get_localized_string(current_date.strftime("%A"), language)
-        is_holiday = get_holiday(current_date)
+        day_of_week = current_date.strftime("%A")
+        is_holiday = get_holiday(current_date, subdiv)
         
         # Simulate weather and temperature with seasonality
         temperature, weather = get_weather(current_date, pd.DataFrame(data, columns=columns))
 
         # Get seasonal + influenced sales
-        sales, unexpected = get_sales(current_date, pd.DataFrame(data, columns=columns), temperature, weather, is_holiday, language)
+        sales, unexpected = get_sales(current_date, pd.DataFrame(data, columns=columns), temperature, weather, is_holiday, avg_sales=avg_sales, event_chance=event_chance)
         
         # Generate order quantities based on previous sales (introduce some randomness)
         # to start, always order last week's sales
@@ -187,17 +322,270 @@ def generate_synthetic_data(start_date, end_date, language):
         current_date += timedelta(days=1)
 
     # Create and return DataFrame    
-    return pd.DataFrame(data, columns=columns)
+    return pd.DataFrame(data, columns=columns).astype(HISTORY_DTYPES)
+
+def _simulate_weather(months, rng, previous=None):
+    """Simulates the weather Markov chain and the bounded temperature walk of get_weather in one pass.
+    :param months: Month (1-12) of each day, as np.ndarray.
+    :param rng: np.random.Generator to draw from.
+    :param previous: temperature and weather code of the day before the first one, to continue a history.
+    :return: temperatures, weather codes (indices into WEATHER_CONDITIONS) as np.ndarrays
+    """
+    n = len(months)
+    base_temperatures = (10 + 10 * np.sin((months - 3) * 2 * np.pi / 12)).astype(int)
+    warm_months = np.isin(months, [5, 6, 7, 8, 9])
+
+    # Transition probabilities by previous weather (rows) as in get_weather, plus a snow-free variant
+    transitions = np.array([
+        [0.5, 0.2, 0.1, 0.2],  # after sun
+        [0.2, 0.4, 0.1, 0.3],  # after rain
+        [0.1, 0.1, 0.4, 0.4],  # after snow
+        [0.5, 0.2, 0.1, 0.2],  # after clouds
+    ])
+    transitions_no_snow = transitions.copy()
+    transitions_no_snow[:, 2] = 0
+    transitions_no_snow /= transitions_no_snow.sum(axis=1, keepdims=True)
+    cumulative = np.cumsum(transitions, axis=1).tolist()
+    cumulative_no_snow = np.cumsum(transitions_no_snow, axis=1).tolist()
+
+    # Draw all randomness up front
+    temp_variations = rng.integers(-5, 6, size=n).tolist()
+    weather_draws = rng.random(n).tolist()
+
+    temperatures = np.empty(n, dtype=int)
+    weather_codes = np.empty(n, dtype=int)
+    if n == 0:
+        return temperatures, weather_codes
+
+    # First day without history, or continuing from the day before
+    if previous is None:
+        temperature = int(base_temperatures[0]) + int(rng.integers(-5, 5))
+        weather = int(np.searchsorted(np.cumsum([0.6, 0.2, 0.1, 0.1]), weather_draws[0], side="right"))
+        temperatures[0], weather_codes[0] = temperature, weather
+        first = 1
+    else:
+        temperature, weather = map(int, previous)
+        first = 0
+
+    # Sequential part: temperature walk and weather persistence, plain scalar arithmetic
+    lower = (base_temperatures - 10).tolist()
+    upper = (base_temperatures + 10).tolist()
+    warm = warm_months.tolist()
+    for i in range(first, n):
+        temperature = max(min(temperature + temp_variations[i], upper[i]), lower[i])
+        probs = cumulative_no_snow[weather] if (warm[i] and temperature > 2) else cumulative[weather]
+        draw = weather_draws[i]
+        weather = 0
+        while weather < 3 and draw >= probs[weather]:
+            weather += 1
+        temperatures[i], weather_codes[i] = temperature, weather
+
+    return temperatures, weather_codes
 
-def generate_tomorrow(data_history, language):
+def _simulate_days(start_date, end_date, rng, subdiv=HOLIDAY_SUBDIV, recent=None):
+    """Simulates what all series of a region share: calendar, holidays, weather and temperature.
+    :param recent: dict of np.ndarrays temperatures and weather_codes of the (up to 7) days before start_date,
+        to continue a history seamlessly; by default, the simulation starts without history.
+    :return: dict of np.ndarrays with one entry per day (dates, weekdays, daytypes, temperatures, weather_codes,
+        and the rolling 7-day context avg_recent_temp, recent_rain_days as used by get_sales)
+    """
+    n = (end_date - start_date) // timedelta(days=1) + 1 if end_date >= start_date else 0
+    dates = [start_date + timedelta(days=i) for i in range(n)]
+    months = np.array([date.month for date in dates], dtype=int)
+    recent_temperatures = np.asarray(recent["temperatures"] if recent else [], dtype=int)[-7:]
+    recent_weather_codes = np.asarray(recent["weather_codes"] if recent else [], dtype=int)[-7:]
+
+    # Weather and temperature
+    previous = (recent_temperatures[-1], recent_weather_codes[-1]) if len(recent_temperatures) else None
+    temperatures, weather_codes = _simulate_weather(months, rng, previous)
+
+    # Rolling context over the previous 7 days (excluding today), as history.tail(7) in get_sales
+    window_ends = np.arange(n) + len(recent_temperatures)
+    window_starts = np.maximum(window_ends - 7, 0)
+    window_sizes = window_ends - window_starts
+    temp_cumsum = np.concatenate([[0], np.cumsum(np.concatenate([recent_temperatures, temperatures]))])
+    rain_cumsum = np.concatenate([[0], np.cumsum(np.concatenate([recent_weather_codes, weather_codes]) == 1)])
+    avg_recent_temp = np.where(
+        window_sizes > 0,
+        (temp_cumsum[window_ends] - temp_cumsum[window_starts]) / np.maximum(window_sizes, 1),
+        temperatures,
+    )
+
+    return {
+        "dates": dates,
+        "weekdays": np.array([date.weekday() for date in dates], dtype=int),
+        "daytypes": get_holidays(dates, subdiv=subdiv),
+        "temperatures": temperatures,
+        "weather_codes": weather_codes,
+        "avg_recent_temp": avg_recent_temp,
+        "recent_rain_days": rain_cumsum[window_ends] - rain_cumsum[window_starts],
+    }
+
+def _simulate_sales(days, rng, avg_sales=500, event_chance=0.03, n_series=None):
+    """Simulates sales, unexpected events and orders on the shared days, for a single series or for
+    n_series at once (avg_sales and event_chance can then be given per series, with shape (n_series, 1)).
+    :return: dict of np.ndarrays of shape (days,) or (n_series, days): sales, event_codes (indices into
+        HISTORY_DTYPES["unexpected"], 0 is no event), order, leftover, missed
+    """
+    n = len(days["dates"])
+    size = (n,) if n_series is None else (n_series, n)
+    weekdays, daytypes, temperatures, weather_codes = days["weekdays"], days["daytypes"], days["temperatures"], days["weather_codes"]
+
+    # Base sales pattern: 50% higher on weekends
+    base_sales = avg_sales * np.where(weekdays >= 5, 1.5, 1.0)
+
+    # Weather impact heuristics
+    snow_factor = np.where(days["avg_recent_temp"] > -2, 0.7, 0.8)
+    rain_factor = np.where(days["recent_rain_days"] > 3, 0.95, 0.85)
+    sun_factor = np.where(temperatures > days["avg_recent_temp"] + 5, 0.9, 1.1)
+    weather_factor = np.choose(weather_codes, [sun_factor, rain_factor, snow_factor, np.ones(n)])
+    base_sales = base_sales * weather_factor
+
+    # Holiday impact heuristics
+    is_before = np.array(["before" in daytype for daytype in daytypes], dtype=bool)
+    is_after = np.array(["after" in daytype for daytype in daytypes], dtype=bool) & ~is_before
+    is_new_years_eve = is_before & np.array(["New Year's Day" in daytype for daytype in daytypes], dtype=bool)
+    is_closed = (daytypes != "normal") & ~is_before & ~is_after
+    base_sales = base_sales * np.where(is_before, 1.2, 1.0) * np.where(is_new_years_eve, 3.0, 1.0) * np.where(is_after, 1.1, 1.0)
+
+    # Random unforeseen events (not on closed days), event codes index HISTORY_DTYPES["unexpected"], 0 is no event
+    event_modifiers = np.array([1.0] + [modifier for _, modifier in UNEXPECTED_EVENTS])
+    has_event = (rng.random(size) < event_chance) & ~is_closed
+    event_codes = np.where(has_event, rng.integers(len(UNEXPECTED_EVENTS), size=size) + 1, 0)
+    base_sales = base_sales * event_modifiers[event_codes]
+
+    # Final sales with some variance, no sales on holidays
+    sales = (base_sales * rng.uniform(0.95, 1.05, size=size)).astype(int)
+    sales[..., is_closed] = 0
+
+    # Orders: last week's sales, or sales with some randomness for the first days
+    order = sales + rng.integers(-3, 3, size=size)
+    order[..., 8:] = sales[..., 1:-7]
+    leftover = np.maximum(order - sales, 0)
+    missed = np.maximum(sales - order, 0)
+    return {"sales": sales, "event_codes": event_codes, "order": order, "leftover": leftover, "missed": missed}
+
+def _generate_synthetic_data_vectorized(start_date, end_date, rng, subdiv=HOLIDAY_SUBDIV, avg_sales=500, event_chance=0.03):
+    """Vectorized engine: same model as get_weather/get_sales, but simulated on NumPy arrays in linear time.
+    Produces the same columns as the loop engine with statistically equivalent values (different random stream).
+    """
+
+    days = _simulate_days(start_date, end_date, rng, subdiv)
+    series = _simulate_sales(days, rng, avg_sales, event_chance)
+    return _history_frame(days, series)
+
+def _history_frame(days, series):
+    """Assembles simulated days and sales of a single series into a history DataFrame typed as in HISTORY_DTYPES."""
+    columns = ["date", "dayofweek", "order", "sales", "leftover", "missed", "weather", "temperature", "daytype", "unexpected"]
+    return pd.DataFrame({
+        "date": pd.to_datetime(days["dates"]).astype(HISTORY_DTYPES["date"]),
+        "dayofweek": pd.Categorical.from_codes(days["weekdays"], dtype=HISTORY_DTYPES["dayofweek"]),
+        "order": series["order"].astype(np.int32),
+        "sales": series["sales"].astype(np.int32),
+        "leftover": series["leftover"].astype(np.int32),
+        "missed": series["missed"].astype(np.int32),
+        "weather": pd.Categorical.from_codes(days["weather_codes"], dtype=HISTORY_DTYPES["weather"]),
+        "temperature": days["temperatures"].astype(np.int8),
+        "daytype": pd.Categorical(days["daytypes"]),
+        "unexpected": pd.Categorical.from_codes(series["event_codes"], dtype=HISTORY_DTYPES["unexpected"]),
+    }, columns=columns)
+
+@timed("generate_next_days")
+def generate_next_days(data_history, n_days, subdiv=HOLIDAY_SUBDIV, rng=None, avg_sales=500, event_chance=0.03):
+    """Given the history so far, derives the next n_days at once (vectorized, unlike generate_tomorrow),
+    continuing its weather (and the 7-day weather context that sales depend on).
+    :param data_history: History as pd.DataFrame or HistoryStore; only the last 7 days are needed.
+    :param n_days: Number of days to generate.
+    :param subdiv: The German state to use holidays of.
+    :param rng: np.random.Generator to draw from, by default derived from the global random state (as generate_tomorrow).
+    :return: A pandas DataFrame typed as in HISTORY_DTYPES; order/leftover/missed are 0 until ordered.
+    """
+    rng = rng if rng is not None else np.random.default_rng(np.random.randint(2**31))
+    recent_history = data_history.tail(7)
+    start_date = recent_history["date"].iloc[-1] + timedelta(days=1)
+    recent = {
+        "temperatures": np.asarray(recent_history["temperature"], dtype=int),
+        "weather_codes": pd.Categorical(recent_history["weather"], dtype=HISTORY_DTYPES["weather"]).codes,
+    }
+    days = _simulate_days(start_date, start_date + timedelta(days=n_days - 1), rng, subdiv, recent)
+    series = _simulate_sales(days, rng, avg_sales, event_chance)
+    unordered = {"order": np.zeros(n_days, dtype=int), "leftover": np.zeros(n_days, dtype=int), "missed": np.zeros(n_days, dtype=int)}
+    return _history_frame(days, {**series, **unordered})
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+# Products of the panel and their demand relative to the (cake) base demand
+PRODUCTS = {"cake": 1.0, "cheesecake": 0.6, "tart": 0.4}
+
+def generate_panel_series(n_stores, products=PRODUCTS, avg_sales=500, event_chance=0.03, rng=None):
+    """Draws demand parameters for a panel of series, one per store and product.
+    Store sizes vary log-normally around avg_sales, products scale their store's demand.
+    :param n_stores: Number of stores.
+    :param products: dict of product name to relative demand, see PRODUCTS.
+    :param rng: np.random.Generator to draw from, a fixed seed by default.
+    :return: pd.DataFrame with one row per series: store, product, avg_sales, event_chance
+    """
+    rng = rng if rng is not None else np.random.default_rng(42)
+    store_sizes = rng.lognormal(0, 0.3, size=n_stores)
+    return pd.DataFrame({
+        "store": np.repeat(np.arange(n_stores), len(products)),
+        "product": np.tile(list(products), n_stores),
+        "avg_sales": np.outer(store_sizes * avg_sales, list(products.values())).ravel(),
+        "event_chance": event_chance,
+    })
+
+def generate_panel_data(start_date, end_date, series, subdiv=HOLIDAY_SUBDIV, rng=None):
+    """Generates synthetic data of a panel of series (e.g. stores and products) that share calendar,
+    holidays and weather, vectorized across all series (no loop per series).
+    :param series: pd.DataFrame with one row per series and (at least) avg_sales and event_chance,
+        see generate_panel_series.
+    :param rng: np.random.Generator to draw from, a fixed seed by default.
+    :return: days as pd.DataFrame with the shared history columns (date, dayofweek, weather, temperature,
+        daytype), and a dict of the per-series columns (order, sales, leftover, missed, and unexpected as
+        codes into HISTORY_DTYPES["unexpected"]), each an np.ndarray of shape (days, series)
+    """
+    rng = rng if rng is not None else np.random.default_rng(42)
+    days = _simulate_days(start_date, end_date, rng, subdiv)
+    panel = _simulate_sales(
+        days, rng,
+        avg_sales=series["avg_sales"].to_numpy(dtype=float)[:, None],
+        event_chance=series["event_chance"].to_numpy(dtype=float)[:, None],
+        n_series=len(series),
+    )
+    days_frame = pd.DataFrame({
+        "date": pd.to_datetime(days["dates"]).astype(HISTORY_DTYPES["date"]),
+        "dayofweek": pd.Categorical.from_codes(days["weekdays"], dtype=HISTORY_DTYPES["dayofweek"]),
+        "weather": pd.Categorical.from_codes(days["weather_codes"], dtype=HISTORY_DTYPES["weather"]),
+        "temperature": days["temperatures"].astype(np.int8),
+        "daytype": pd.Categorical(days["daytypes"]),
+    })
+    values = {
+        "order": panel["order"].T.astype(np.int32),
+        "sales": panel["sales"].T.astype(np.int32),
+        "leftover": panel["leftover"].T.astype(np.int32),
+        "missed": panel["missed"].T.astype(np.int32),
+        "unexpected": panel["event_codes"].T.astype(np.int8),
+    }
+    return days_frame, values
+
+def generate_tomorrow(data_history, subdiv=HOLIDAY_SUBDIV):
+    """Given the history so far, derives the next day (without order results).
+    :param data_history: History as pd.DataFrame or HistoryStore; only the last 7 days are needed for weather and sales.
+    :param subdiv: The German state to use holidays of.
+    :return: dict with all history columns, order/leftover/missed are NaN
+    """
     
-    tomorrow_date = data_history["date"].iloc[-1] + timedelta(days=1)
-    tomorrow_temperature, tomorrow_weather = get_weather(tomorrow_date, data_history)
-    tomorrow_holiday = get_holiday(tomorrow_date)
+    recent_history = data_history.tail(7)
+    tomorrow_date = recent_history["date"].iloc[-1] + timedelta(days=1)
+    tomorrow_temperature, tomorrow_weather = get_weather(tomorrow_date, recent_history)
+    tomorrow_holiday = get_holiday(tomorrow_date, subdiv)
     
     # make sure to have at least one almost guaranteed unexpected event in the first few days
     force_event = False
-    events_count = data_history[data_history["unexpected"] != ""].iloc[:-10].shape[0]
+    events_count = getattr(data_history, "event_count", None)  # kept by HistoryStores, DataFrames are counted
+    if events_count is None:
+        events_count = np.count_nonzero(np.asarray(data_history["unexpected"]) != "")
+    events_count = max(events_count - 10, 0)
     if (tomorrow_date > datetime.today() + timedelta(days=2)) and (tomorrow_date < datetime.today() + timedelta(days=14)):
         if events_count == 0:
             if np.random.rand() < .8:
@@ -205,11 +593,11 @@ def generate_tomorrow(data_history, language):
     #print("events_count", events_count)
     #print("force_event", force_event)
             
-    tomorrow_sales, unexpected = get_sales(tomorrow_date, data_history, tomorrow_temperature, tomorrow_weather, tomorrow_holiday, language, force_event)
+    tomorrow_sales, unexpected = get_sales(tomorrow_date, recent_history, tomorrow_temperature, tomorrow_weather, tomorrow_holiday, force_event)
     
     return {
         "date": tomorrow_date, 
-        "dayofweek": get_localized_string(tomorrow_date.strftime("%A"), language), 
+        "dayofweek": tomorrow_date.strftime("%A"), 
         "order": np.nan, 
         "sales": tomorrow_sales, 
         "leftover": np.nan, 
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import logging
+import threading
+
+from foodwaste_demo_ai import *
+
+logger = logging.getLogger("foodwaste_demo.training")
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+class TrainingScheduler:
+    """
+    Trains (warms) all prediction models in a background thread pool as soon as history is
+    available, so a click on the prediction button does not have to wait for training.
+    Trained models end up in the model registry of foodwaste_demo_ai.py.
+    Threads suffice, as XGBoost and NumPy release the GIL while training.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=256):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="training")
+        self._jobs = OrderedDict()  # (dataset id, version, model type) -> future
+        self._lock = threading.Lock()
+
+    def warm(self, data, model_types=("heuristic", "knn", "xgb")):
+        """
+        Schedules training of all model types for the current version of data (if not scheduled yet).
+        :param data: HistoryStore, a snapshot of it is used so appending days does not interfere.
+        """
+        snapshot = data.snapshot()
+        with self._lock:
+            for model_type in model_types:
+                job_key = (snapshot.id, snapshot.version, model_type)
+                if job_key not in self._jobs:
+                    self._jobs[job_key] = self._executor.submit(warm_model, snapshot, model_type)
+                while len(self._jobs) > self.max_jobs:
+                    self._jobs.popitem(last=False)
+
+    def _get_job(self, data, model_type):
+        with self._lock:
+            return self._jobs.get((data.id, data.version, model_type))
+
+    def status(self, data, model_type):
+        """Returns the status of a model for the current version of data: 'ready', 'training', 'failed' or 'pending'."""
+        job = self._get_job(data, model_type)
+        if job is None:
+            return "pending"
+        if not job.done():
+            return "training"
+        return "failed" if job.exception() is not None else "ready"
+
+    def predict(self, data, tomorrow, model_type, language, timeout=0.5, optimize_profit=False):
+        """
+        Returns prediction (or profit-maximizing order, with optimize_profit) and explanation of the
+        given model type, waiting at most timeout seconds for its training. If the model is not ready
+        by then (or its training failed), the heuristic prediction is returned instead, with "fallback_from"
+        set in the explanation. Failed trainings are dropped, so the next request schedules them again.
+        """
+        self.warm(data, (model_type,))
+        job = self._get_job(data, model_type)
+        try:
+            job.result(timeout=timeout)
+        except Exception as exception:
+            if not isinstance(exception, TimeoutError):
+                logger.warning("training %s failed, falling back to the heuristic: %r", model_type, exception)
+                with self._lock:
+                    if self._jobs.get((data.id, data.version, model_type)) is job:
+                        del self._jobs[(data.id, data.version, model_type)]
+            predicted_sales, prediction_explanation = predict_tomorrow_sales_by_type(data.snapshot(), tomorrow, "heuristic", language, optimize_profit)
+            prediction_explanation["fallback_from"] = model_type
+            return predicted_sales, prediction_explanation
+        return predict_tomorrow_sales_by_type(data.snapshot(), tomorrow, model_type, language, optimize_profit)
+
+# Background training for all sessions
+training_scheduler = TrainingScheduler()
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from foodwaste_demo_syntheticdata import generate_synthetic_data, WEATHER_CONDITIONS
+from foodwaste_demo_history import HistoryStore, FEATURES, LAG_FEATURES, RAIN_CODE
+
+# std7 is computed from running sums of squares, so it differs from pandas by rounding errors
+TOLERANCE = dict(rtol=1e-9, atol=1e-4, equal_nan=True)
+
+@pytest.fixture(scope="module")
+def data():
+    return generate_synthetic_data(datetime(2024, 1, 1), datetime(2024, 5, 31))
+
+def rows(frame):
+    return frame.to_dict(orient="records")
+
+def expected_lag_features(data):
+    """The LAG_FEATURES of every day of data, computed with pandas from the days before it only."""
+    sales = data["sales"].astype(float).reset_index(drop=True)
+    previous = sales.shift(1)
+    weekdays = pd.DatetimeIndex(data["date"]).weekday.to_numpy()
+    rain = (data["weather"] == WEATHER_CONDITIONS[RAIN_CODE]).astype(float).reset_index(drop=True)
+    temperature = data["temperature"].astype(float).reset_index(drop=True)
+    return pd.DataFrame({
+        "sales_lag1": sales.shift(1),
+        "sales_lag7": sales.shift(7),
+        "sales_lag14": sales.shift(14),
+        "sales_mean7": previous.rolling(7, min_periods=1).mean(),
+        "sales_std7": previous.rolling(7, min_periods=1).std(ddof=0),
+        "sales_weekday_mean4": sales.groupby(weekdays).transform(lambda values: values.shift(1).rolling(4, min_periods=1).mean()),
+        "rain_days7": rain.shift(1).rolling(7, min_periods=1).sum(),
+        "temperature_mean7": temperature.shift(1).rolling(7, min_periods=1).mean(),
+    })[LAG_FEATURES]
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def test_incremental_bulk_and_forked_builds_agree(data):
+    bulk = HistoryStore.from_frame(data)
+
+    incremental = HistoryStore()
+    for row in rows(data):
+        incremental.append(row)
+
+    base = HistoryStore.from_frame(data.iloc[:60])
+    forked = base.fork()
+    forked.extend(data.iloc[60:100])
+    for row in rows(data.iloc[100:]):
+        forked.append(row)
+
+    np.testing.assert_allclose(incremental.features(), bulk.features(), **TOLERANCE)
+    np.testing.assert_allclose(forked.features(), bulk.features(), **TOLERANCE)
+    np.testing.assert_array_equal(forked.codes("sales"), bulk.codes("sales"))
+    events = np.count_nonzero(data["unexpected"] != "")
+    assert bulk.event_count == incremental.event_count == forked.event_count == events
+    assert base.event_count == np.count_nonzero(data["unexpected"].iloc[:60] != "")
+
+def test_lag_features_match_pandas(data):
+    features = HistoryStore.from_frame(data).features()
+    lags = features[:, [FEATURES.index(name) for name in LAG_FEATURES]]
+    np.testing.assert_allclose(lags, expected_lag_features(data).to_numpy(), **TOLERANCE)
+
+def test_lag_features_do_not_leak(data):
+    day = 90
+    changed = data.copy()
+    changed.loc[changed.index[day:], "sales"] += 1000
+    features = HistoryStore.from_frame(data).features()
+    changed_features = HistoryStore.from_frame(changed).features()
+    # features of a day only use the days before it, so changing its own and later sales leaves them as they are
+    np.testing.assert_allclose(changed_features[:day + 1], features[:day + 1], **TOLERANCE)
+    assert not np.allclose(changed_features[day + 1:], features[day + 1:], equal_nan=True)
+
+@pytest.mark.parametrize("forked", [False, True])
+def test_next_features_equal_features_after_appending(data, forked):
+    history = HistoryStore.from_frame(data.iloc[:-1])
+    if forked:
+        history = history.fork()
+    tomorrow = rows(data.iloc[-1:])[0]
+    next_features = history.next_features(tomorrow)
+    history.append(tomorrow)
+    np.testing.assert_allclose(next_features[0], history.features()[-1], **TOLERANCE)
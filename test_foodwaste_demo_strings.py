@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from foodwaste_demo_strings import get_localized_string, localize_column
+
+WEEKDAYS = ["Monday", "Tuesday", "Monday", "unknown key"]
+
+# ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- ------- ---- -------
+
+def test_localize_column_matches_get_localized_string():
+    expected = [get_localized_string(key, "Deutsch") for key in WEEKDAYS]
+    assert expected[:2] == ["Montag", "Dienstag"]
+
+    translated = localize_column(WEEKDAYS, "Deutsch")
+    assert isinstance(translated, np.ndarray)
+    assert list(translated) == expected
+
+    series = pd.Series(WEEKDAYS, index=[10, 11, 12, 13], name="dayofweek")
+    translated_series = localize_column(series, "Deutsch")
+    assert translated_series.name == "dayofweek"
+    assert list(translated_series.index) == [10, 11, 12, 13]
+    assert list(translated_series) == expected
+
+def test_localize_column_renames_categories():
+    categorical = pd.Series(WEEKDAYS[:3], dtype="category")
+    translated = localize_column(categorical, "Deutsch")
+    assert isinstance(translated.dtype, pd.CategoricalDtype)
+    assert list(translated.cat.categories) == ["Montag", "Dienstag"]
+    assert list(translated) == ["Montag", "Dienstag", "Montag"]
+    np.testing.assert_array_equal(translated.cat.codes, categorical.cat.codes)